@@ -13,5 +13,15 @@ django-admin migrate
 
 django-admin collectstatic --noinput
 
+# Load the IAM policies and admin user once, rather than in every worker
+django-admin bootstrap
+
+# Load the zip code centroids addresses are geocoded with. Skipped unless the file has changed since it was last loaded
+django-admin load_zip_centroids
+
+# Run the nightly tasks in their own process, so the web workers don't each start a scheduler
+django-admin run_scheduler &
+
 # Start foundry
-gunicorn --bind=0.0.0.0 --workers=2 foundry_backend.wsgi:application
\ No newline at end of file
+FOUNDRY_BOOTSTRAP_ON_STARTUP=false FOUNDRY_SCHEDULER_AUTOSTART=false gunicorn -c python:foundry_backend.gunicorn_config \
+    --bind=0.0.0.0 --workers=2 foundry_backend.wsgi:application
\ No newline at end of file
@@ -2,7 +2,8 @@ import json
 import logging
 from typing import List
 from rest_access_policy import AccessPolicy
-from .. import models
+from . import policy_cache
+from .compiled_policy import CompiledPolicy
 
 
 class APIAccessPolicyBase(AccessPolicy):
@@ -17,24 +18,42 @@ class APIAccessPolicyBase(AccessPolicy):
     def model_name(self):
         return self._model_name
 
-    def get_policy_statements(self, request, view) -> List[dict]:
-        default_policy_query = models.IAMPolicy.objects.filter(name='default')
+    def has_permission(self, request, view) -> bool:
+        action = self._get_invoked_action(view)
+        return self.get_compiled_policy(request, view).has_permission(self, request, view, action)
+
+    def get_compiled_policy(self, request, view) -> CompiledPolicy:
+        # a request sees one version of the policies, however many times it is checked
+        compiled_policies = request.__dict__.setdefault('_compiled_policies', {})
+
+        if self.model_name not in compiled_policies:
+            compiled_policies[self.model_name] = self._get_compiled_policy()
+
+        return compiled_policies[self.model_name]
 
-        if not default_policy_query.exists():
+    def _get_compiled_policy(self) -> CompiledPolicy:
+        policy_cache.refresh()
+
+        default_policy = policy_cache.get_policy('default')
+
+        if default_policy is None:
             raise Exception('The default API Access Policy was not found')
 
-        model_policy_query = models.IAMPolicy.objects.filter(name=self.model_name)
+        policy = policy_cache.get_policy(self.model_name)
 
-        if not model_policy_query.exists():
-            policy_data = default_policy_query.get().serialize().get('statements')
+        if policy is None:
             self.logger.debug('Attempted to get access policy for model \'{}\', failed.'.format(self.model_name))
-            self.logger.debug('Using default access policy instead: \'{}\''.format(json.dumps(policy_data)))
-            return policy_data
+            self.logger.debug(
+                'Using default access policy instead: \'{}\''.format(json.dumps(default_policy.statements))
+            )
+            return default_policy
         else:
-            policy_data = model_policy_query.get().serialize().get('statements')
             self.logger.debug('Attempted to get access policy for model \'{}\', success!.'.format(self.model_name))
-            self.logger.debug('Using access policy: {}'.format(json.dumps(json.dumps(policy_data, indent=2))))
-            return policy_data
+            self.logger.debug('Using access policy: {}'.format(json.dumps(json.dumps(policy.statements, indent=2))))
+            return policy
+
+    def get_policy_statements(self, request, view) -> List[dict]:
+        return self.get_compiled_policy(request, view).statements
 
 
 def make_access_policy(formatting_name: str, model_name: str) -> type(APIAccessPolicyBase):
@@ -0,0 +1,164 @@
+import importlib
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from rest_access_policy import AccessPolicyException
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+ID_PREFIX = 'id:'
+GROUP_PREFIX = 'group:'
+
+_ANONYMOUS_USER = SimpleNamespace(id=None, is_anonymous=True)
+
+
+def resolve_reusable_condition(name: str) -> Optional[Callable]:
+    """
+    Find a condition in the DRF_ACCESS_POLICY 'reusable_conditions' module
+
+    :param name: the name of the condition function
+    :return: the function, or None if it does not exist
+    """
+    module_path = settings.DRF_ACCESS_POLICY.get('reusable_conditions')
+
+    if not module_path:
+        return None
+
+    return getattr(importlib.import_module(module_path), name, None)
+
+
+class CompiledStatement:
+    """
+    A single policy statement, with its principals split into sets and its conditions resolved
+    """
+    def __init__(self, statement: dict, resolve_condition: Callable[[str], Optional[Callable]]):
+        principals = statement['principal']
+
+        self.allow = statement['effect'] == 'allow'
+        self.actions = frozenset(statement['action'])
+
+        self.any_principal = '*' in principals
+        self.authenticated = 'authenticated' in principals
+        self.anonymous = 'anonymous' in principals
+        self.ids = frozenset(p[len(ID_PREFIX):] for p in principals if p.startswith(ID_PREFIX))
+        self.groups = frozenset(p[len(GROUP_PREFIX):] for p in principals if p.startswith(GROUP_PREFIX))
+
+        self.conditions = []
+
+        for condition in statement['condition']:
+            parts = condition.split(':', 1)
+            self.conditions.append((condition, parts[1] if len(parts) == 2 else None, resolve_condition(parts[0])))
+
+    def matches_action(self, action: str, safe: bool) -> bool:
+        return action in self.actions or '*' in self.actions or (safe and '<safe_methods>' in self.actions)
+
+    def matches_principal(self, user, get_groups: Callable[[], frozenset]) -> bool:
+        # the order of these checks mirrors drf-access-policy, where the first keyword found decides
+        if self.any_principal:
+            return True
+        elif self.authenticated:
+            return not user.is_anonymous
+        elif self.anonymous:
+            return user.is_anonymous
+        elif str(user.id) in self.ids:
+            return True
+
+        return bool(self.groups) and not self.groups.isdisjoint(get_groups())
+
+    def matches_conditions(self, request, view, action: str) -> bool:
+        for condition, arg, method in self.conditions:
+            if method is None:
+                raise AccessPolicyException(
+                    'condition \'{}\' must be defined in the \'reusable_conditions\' module'.format(condition)
+                )
+
+            result = method(request, view, action) if arg is None else method(request, view, action, arg)
+
+            if type(result) is not bool:
+                raise AccessPolicyException(
+                    'condition \'{}\' must return true/false, not {}'.format(condition, type(result))
+                )
+
+            if not result:
+                return False
+
+        return True
+
+
+class CompiledPolicy:
+    """
+    An IAM policy compiled for fast evaluation
+
+    Statements are bucketed by (action, safe method) the first time that pair is seen, and each bucket keeps its
+    deny statements ahead of its allow statements, so evaluation stops at the first statement that decides the result.
+    """
+    def __init__(self, statements: List[dict],
+                 resolve_condition: Callable[[str], Optional[Callable]] = resolve_reusable_condition):
+        self.statements = statements
+        self._compiled = [CompiledStatement(statement, resolve_condition) for statement in statements]
+        self._buckets: Dict[Tuple[str, bool], Tuple[List[CompiledStatement], List[CompiledStatement]]] = {}
+        self._public: Dict[Tuple[str, bool], bool] = {}
+
+    def _get_bucket(self, action: str, safe: bool) -> Tuple[List[CompiledStatement], List[CompiledStatement]]:
+        bucket = self._buckets.get((action, safe))
+
+        if bucket is None:
+            matched = [statement for statement in self._compiled if statement.matches_action(action, safe)]
+            bucket = ([s for s in matched if not s.allow], [s for s in matched if s.allow])
+            self._buckets[(action, safe)] = bucket
+
+        return bucket
+
+    def has_permission(self, policy, request, view, action: str) -> bool:
+        """
+        Evaluate the policy for a request
+
+        :param policy: the access policy instance, used to look up the user's groups
+        :param request: the request being checked
+        :param view: the view handling the request
+        :param action: the view action being invoked
+        :return: True if an allow statement matches and no deny statement does
+        """
+        denies, allows = self._get_bucket(action, request.method in SAFE_METHODS)
+        user = request.user
+        groups = []
+
+        def get_groups() -> frozenset:
+            if not groups:
+                groups.append(frozenset(policy.get_user_group_values(user)))
+
+            return groups[0]
+
+        for statement in denies:
+            if statement.matches_principal(user, get_groups) and statement.matches_conditions(request, view, action):
+                return False
+
+        for statement in allows:
+            if statement.matches_principal(user, get_groups) and statement.matches_conditions(request, view, action):
+                return True
+
+        return False
+
+    def is_public(self, action: str, safe: bool) -> bool:
+        """
+        Check if anyone, signed in or not, may invoke an action, whatever the request
+
+        :param action: the view action
+        :param safe: whether the request method is a safe one
+        :return: True if an unconditional allow statement covers anonymous users and no deny statement could apply to
+                 them
+        """
+        public = self._public.get((action, safe))
+
+        if public is None:
+            denies, allows = self._get_bucket(action, safe)
+            no_groups = frozenset
+
+            public = not any(statement.matches_principal(_ANONYMOUS_USER, no_groups) for statement in denies) and \
+                any(statement.matches_principal(_ANONYMOUS_USER, no_groups) and not statement.conditions
+                    for statement in allows)
+
+            self._public[(action, safe)] = public
+
+        return public
@@ -1,21 +1,22 @@
 import logging
 
 from foundry_backend.database import models
+from .ownership import get_owning_agency_id, get_realtor_ids, is_member_of_agency
 
 
 def is_owner_of_user_message(request, view, _) -> bool:
     message: models.UserMessage = view.get_object()
-    return message.user.id == request.user.id
+    return message.user_id == request.user.id
 
 
 def is_owner_of_avatar(request, view, _) -> bool:
     avatar: models.Avatar = view.get_object()
-    return avatar.user.id == request.user.id
+    return avatar.user_id == request.user.id
 
 
 def is_agent_in_agency(request, view, _) -> bool:
     agency: models.Agency = view.get_object()
-    return agency.mls_numbers.filter(user_id=request.user.id).exists()
+    return is_member_of_agency(request, agency.id)
 
 
 def realtor_owns_listing(request, view, _) -> bool:
@@ -23,7 +24,10 @@ def realtor_owns_listing(request, view, _) -> bool:
 
     logger.debug('Evaluating \'realtor_owns_listing\' condition...')
 
-    if view.get_object().agent.id == request.user.mls_number.id:
+    listing: models.Listing = view.get_object()
+    mls_number_id = get_realtor_ids(request)[0]
+
+    if mls_number_id is not None and listing.agent_id == mls_number_id:
         logger.debug('Success! User is owner')
         return True
 
@@ -36,18 +40,10 @@ def property_belongs_to_agency(request, view, _) -> bool:
 
     logger.debug('Using \'property_belongs_to_agency\'')
 
-    if isinstance(view.get_object(), models.Listing):
-        listing: models.Listing = view.get_object()
-        return listing.agent.agency.mls_numbers.filter(user_id=request.user.id).exists()
-    elif isinstance(view.get_object(), models.Property):
-        prop: models.Property = view.get_object()
-        return prop.listing.agent.agency.mls_numbers.filter(user_id=request.user.id).exists()
-    elif True in [isinstance(view.get_object(), obj) for obj in [models.HomeAlarm, models.Room]]:
-        obj = view.get_object()
-        return obj.property.listing.agent.agency.mls_numbers.filter(user_id=request.user.id).exists()
-    elif isinstance(view.get_object(), models.Showing):
-        showing: models.Showing = view.get_object()
-        return showing.listing.agent.agency.mls_numbers.filter(user_id=request.user.id).exists()
+    obj = view.get_object()
+
+    if isinstance(obj, (models.Listing, models.Property, models.HomeAlarm, models.Room, models.Showing)):
+        return is_member_of_agency(request, get_owning_agency_id(obj))
 
     return True
 
@@ -59,5 +55,5 @@ def can_modify_showing(request, view, _) -> bool:
 
     showing: models.Showing = view.get_object()
 
-    return showing.listing.agent.agency.mls_numbers.filter(user_id=request.user.id).exists() or \
-        showing.agent.agency.mls_numbers.filter(user_id=request.user.id).exists()
+    return is_member_of_agency(request, get_owning_agency_id(showing)) or \
+        is_member_of_agency(request, get_owning_agency_id(showing, ('agent', 'agency_id')))
@@ -0,0 +1,79 @@
+from typing import Optional, Tuple
+
+from foundry_backend.database import models
+
+# the relations to follow from each model to the id of the agency that owns it
+AGENCY_PATHS = {
+    models.Agency: ('id',),
+    models.Listing: ('agent', 'agency_id'),
+    models.Property: ('listing', 'agent', 'agency_id'),
+    models.Room: ('property', 'listing', 'agent', 'agency_id'),
+    models.HomeAlarm: ('property', 'listing', 'agent', 'agency_id'),
+    models.Showing: ('listing', 'agent', 'agency_id'),
+}
+
+_NOT_LOADED = object()
+
+
+def _follow_loaded_relations(obj, path: Tuple[str, ...]):
+    for name in path[:-1]:
+        if not obj._meta.get_field(name).is_cached(obj):
+            return _NOT_LOADED
+
+        obj = getattr(obj, name)
+
+        if obj is None:
+            return None
+
+    return getattr(obj, path[-1])
+
+
+def get_owning_agency_id(obj, path: Optional[Tuple[str, ...]] = None) -> Optional[int]:
+    """
+    Find the agency that owns an object
+
+    Relations that are already loaded (e.g. through select_related) are followed for free; otherwise the whole chain
+    is resolved in a single query.
+
+    :param obj: a Listing, Property, Room, HomeAlarm, Showing or Agency
+    :param path: the relations to follow, if not the model's default in AGENCY_PATHS
+    :return: the id of the owning agency
+    """
+    path = path or AGENCY_PATHS[type(obj)]
+    agency_id = _follow_loaded_relations(obj, path)
+
+    if agency_id is _NOT_LOADED:
+        agency_id = type(obj).objects.filter(pk=obj.pk).values_list('__'.join(path), flat=True).first()
+
+    return agency_id
+
+
+def get_realtor_ids(request) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Get the requesting user's MLS number and agency, cached on the request
+
+    :param request: the request being checked
+    :return: (mls number id, agency id), or (None, None) if the user is not a realtor
+    """
+    if not hasattr(request, '_realtor_ids'):
+        realtor_ids = None
+
+        if request.user.is_authenticated:
+            realtor_ids = models.MLSNumber.objects.filter(user_id=request.user.id).values_list('id', 'agency_id').first()
+
+        request._realtor_ids = realtor_ids or (None, None)
+
+    return request._realtor_ids
+
+
+def is_member_of_agency(request, agency_id: Optional[int]) -> bool:
+    """
+    Check if the requesting user is a realtor in an agency
+
+    :param request: the request being checked
+    :param agency_id: the agency's id
+    :return: True if the user holds an MLS number in the agency
+    """
+    _, user_agency_id = get_realtor_ids(request)
+
+    return user_agency_id is not None and user_agency_id == agency_id
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .. import models
+from .compiled_policy import CompiledPolicy
+
+logger = logging.getLogger('access')
+
+_lock = threading.Lock()
+
+# policy name -> compiled policy
+_policies: Optional[Dict[str, CompiledPolicy]] = None
+
+# bumped on every invalidation, so callers can tell if what they hold is stale
+_version = 0
+
+# the shared generation the cache was last checked against, and when that check happened
+_generation: Optional[int] = None
+_last_generation_check = 0.0
+
+GENERATION_ID = 1
+
+
+def _compile_policies() -> Dict[str, CompiledPolicy]:
+    """
+    Load and compile every IAM policy in a single pass
+
+    :return: a mapping of policy name to its compiled policy
+    """
+    policies = models.IAMPolicy.objects.prefetch_related('statements__principals', 'statements__conditions')
+
+    return {policy.name: CompiledPolicy(policy.serialize().get('statements')) for policy in policies}
+
+
+def get_version() -> int:
+    return _version
+
+
+def get_generation() -> int:
+    """
+    Read the shared policy generation from the database
+
+    :return: the current generation, or 0 if no policy has ever been changed
+    """
+    generation = models.IAMPolicyGeneration.objects.filter(pk=GENERATION_ID).values_list('generation', flat=True)
+
+    return generation.first() or 0
+
+
+def bump_generation():
+    """
+    Tell every worker that the IAM policies have changed
+    """
+    updated = models.IAMPolicyGeneration.objects.filter(pk=GENERATION_ID).update(generation=F('generation') + 1)
+
+    if not updated:
+        models.IAMPolicyGeneration.objects.get_or_create(pk=GENERATION_ID, defaults={'generation': 1})
+
+
+def refresh():
+    """
+    Drop the cache if another worker has changed the IAM policies since it was last checked
+
+    The check is one primary key read, done at most once every IAM_POLICY_GENERATION_CHECK_INTERVAL milliseconds
+    """
+    global _generation, _last_generation_check
+
+    now = time.monotonic()
+
+    if (now - _last_generation_check) * 1000 < settings.IAM_POLICY_GENERATION_CHECK_INTERVAL:
+        return
+
+    generation = get_generation()
+
+    if generation != _generation:
+        logger.debug('IAM policy generation changed from {} to {}'.format(_generation, generation))
+        invalidate()
+        _generation = generation
+
+    _last_generation_check = now
+
+
+def get_policy(name: str) -> Optional[CompiledPolicy]:
+    """
+    Get a compiled policy, filling the cache if needed
+
+    :param name: the name of the policy
+    :return: the compiled policy, or None if no such policy exists
+    """
+    global _policies
+
+    policies = _policies
+
+    if policies is None:
+        with _lock:
+            if _policies is None:
+                logger.debug('Compiling IAM policy cache (version {})'.format(_version))
+                _policies = _compile_policies()
+
+            policies = _policies
+
+    return policies.get(name)
+
+
+def get_policy_statements(name: str) -> Optional[List[dict]]:
+    """
+    Get the serialized statements for a policy, filling the cache if needed
+
+    :param name: the name of the policy
+    :return: the policy's statements, or None if no such policy exists
+    """
+    policy = get_policy(name)
+
+    return policy.statements if policy is not None else None
+
+
+def invalidate():
+    """
+    Drop all compiled policies. The next lookup will rebuild the cache
+    """
+    global _policies, _version, _last_generation_check
+
+    with _lock:
+        _policies = None
+        _version += 1
+        _last_generation_check = 0.0
+
+
+@receiver(post_save, sender=models.IAMPolicy)
+@receiver(post_delete, sender=models.IAMPolicy)
+@receiver(post_save, sender=models.IAMPolicyStatement)
+@receiver(post_delete, sender=models.IAMPolicyStatement)
+@receiver(post_save, sender=models.IAMPolicyStatementPrincipal)
+@receiver(post_delete, sender=models.IAMPolicyStatementPrincipal)
+@receiver(post_save, sender=models.IAMPolicyStatementCondition)
+@receiver(post_delete, sender=models.IAMPolicyStatementCondition)
+def _invalidate_on_change(**kwargs):
+    invalidate()
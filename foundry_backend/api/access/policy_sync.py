@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from foundry_backend.api import models
+from foundry_backend.api.access import policy_cache
+from foundry_backend.api.serializers import IAMPolicySerializer
+
+
+def normalize_policy(document: dict) -> dict:
+    """
+    Reduce a permissions file policy to the fields stored in the database
+
+    :param document: a policy, as written in the permissions file
+    :return: the policy, without ids or defaults left implicit
+    """
+    return {
+        'name': document['name'],
+        'notes': document.get('notes'),
+        'statements': [normalize_statement(statement) for statement in document['statements']]
+    }
+
+
+def normalize_statement(document: dict) -> dict:
+    return {
+        'notes': document.get('notes'),
+        'actions': sorted(document['actions']),
+        'effect': document['effect'],
+        'principals': sorted(principal['value'] for principal in document['principals']),
+        'conditions': sorted(condition['value'] for condition in document['conditions'])
+    }
+
+
+def describe_policy(policy: models.IAMPolicy) -> dict:
+    """
+    Describe a stored policy in the same form as normalize_policy
+
+    :param policy: a policy, with its statements, principals and conditions prefetched
+    """
+    return {
+        'name': policy.name,
+        'notes': policy.notes,
+        'statements': [{
+            'notes': statement.notes,
+            'actions': sorted(statement.actions),
+            'effect': statement.effect,
+            'principals': sorted(principal.value for principal in statement.principals.all()),
+            'conditions': sorted(condition.value for condition in statement.conditions.all())
+        } for statement in policy.statements.all()]
+    }
+
+
+def hash_policy(policy: dict) -> str:
+    """
+    Hash a normalized policy, so that equal policies hash the same however their file is formatted
+    """
+    return hashlib.sha256(json.dumps(policy, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _sync_values(related, model, statement: models.IAMPolicyStatement, wanted: List[str]):
+    # principals and conditions have no identity beyond their value, so only the difference is written
+    existing = {}
+    for row in related:
+        existing.setdefault(row.value, []).append(row)
+
+    surplus = Counter({value: len(rows) for value, rows in existing.items()})
+    surplus.subtract(Counter(wanted))
+
+    stale = [row.id for value, count in surplus.items() if count > 0 for row in existing[value][:count]]
+    missing = [model(statement=statement, value=value) for value, count in surplus.items() if count < 0
+               for _ in range(-count)]
+
+    if stale:
+        model.objects.filter(id__in=stale).delete()
+    if missing:
+        model.objects.bulk_create(missing)
+
+
+def _sync_statement(policy: models.IAMPolicy, statement: Optional[models.IAMPolicyStatement], wanted: dict,
+                    current: Optional[dict]) -> bool:
+    if current == wanted:
+        return False
+
+    if statement is None:
+        statement = models.IAMPolicyStatement.objects.create(policy=policy, notes=wanted['notes'],
+                                                             actions=wanted['actions'], effect=wanted['effect'])
+        related_principals, related_conditions = [], []
+    else:
+        if (current['notes'], current['actions'], current['effect']) != \
+                (wanted['notes'], wanted['actions'], wanted['effect']):
+            statement.notes = wanted['notes']
+            statement.actions = wanted['actions']
+            statement.effect = wanted['effect']
+            statement.save(update_fields=['notes', 'actions', 'effect'])
+
+        related_principals, related_conditions = statement.principals.all(), statement.conditions.all()
+
+    _sync_values(related_principals, models.IAMPolicyStatementPrincipal, statement, wanted['principals'])
+    _sync_values(related_conditions, models.IAMPolicyStatementCondition, statement, wanted['conditions'])
+
+    return True
+
+
+def _sync_policy(policy: Optional[models.IAMPolicy], wanted: dict) -> List[str]:
+    changes = []
+
+    if policy is None:
+        policy = models.IAMPolicy.objects.create(name=wanted['name'], notes=wanted['notes'])
+        statements, current = [], []
+        changes.append('create policy \'{}\''.format(wanted['name']))
+    else:
+        statements = list(policy.statements.all())
+        current = describe_policy(policy)['statements']
+
+        if policy.notes != wanted['notes']:
+            policy.notes = wanted['notes']
+            policy.save(update_fields=['notes'])
+            changes.append('update policy \'{}\''.format(policy.name))
+
+    # statements have no natural key, so they are matched up in order
+    for index, wanted_statement in enumerate(wanted['statements']):
+        statement = statements[index] if index < len(statements) else None
+        current_statement = current[index] if index < len(current) else None
+
+        if _sync_statement(policy, statement, wanted_statement, current_statement):
+            changes.append('{} statement {} of \'{}\''.format('create' if statement is None else 'update',
+                                                              index, policy.name))
+
+    for index, statement in enumerate(statements[len(wanted['statements']):], len(wanted['statements'])):
+        statement.delete()
+        changes.append('delete statement {} of \'{}\''.format(index, policy.name))
+
+    return changes
+
+
+def sync_policies(documents: Iterable[dict], logger: logging.Logger, prune: bool = False,
+                  dry_run: bool = False, force: bool = False) -> List[str]:
+    """
+    Bring the stored IAM policies in line with a permissions file, writing only what differs
+
+    Each policy is compared by hash first, so unchanged policies cost nothing but the initial read. Everything is
+    written in one transaction, so other workers never see a half-synced policy.
+
+    Only policies still as the file last left them are updated. A policy changed through the API since, or one that
+    was never loaded from the file, is left alone unless `force` is set.
+
+    :param documents: the policies from the permissions file
+    :param logger: the logger to report changes to
+    :param prune: delete stored policies that are not in the file
+    :param dry_run: work out the changes, then roll them back
+    :param force: overwrite policies changed through the API too
+    :return: a description of each change
+    """
+    changes = []
+
+    with transaction.atomic():
+        statements = models.IAMPolicyStatement.objects.order_by('id').prefetch_related('principals', 'conditions')
+        stored: Dict[str, models.IAMPolicy] = {
+            policy.name: policy
+            for policy in models.IAMPolicy.objects.prefetch_related(Prefetch('statements', queryset=statements))
+        }
+
+        seen = set()
+
+        for document in documents:
+            policy = stored.get(document['name'])
+            seen.add(document['name'])
+
+            serializer = IAMPolicySerializer(policy, data=document)
+            if not serializer.is_valid():
+                logger.warning('Skipping invalid policy \'{}\': {}'.format(document['name'], serializer.errors))
+                continue
+
+            wanted = normalize_policy(document)
+            wanted_hash = hash_policy(wanted)
+
+            if policy is not None:
+                current_hash = hash_policy(describe_policy(policy))
+
+                if current_hash == wanted_hash:
+                    if policy.source_hash != wanted_hash:
+                        models.IAMPolicy.objects.filter(pk=policy.pk).update(source_hash=wanted_hash)
+                    continue
+
+                if current_hash != policy.source_hash and not force:
+                    logger.warning('Leaving policy \'{}\' alone: it has been changed since it was loaded from the '
+                                   'permissions file'.format(policy.name))
+                    continue
+
+            changes.extend(_sync_policy(policy, wanted))
+            models.IAMPolicy.objects.filter(name=wanted['name']).update(source_hash=wanted_hash)
+
+        if prune:
+            for name in sorted(set(stored) - seen):
+                stored[name].delete()
+                changes.append('delete policy \'{}\''.format(name))
+
+        for change in changes:
+            logger.info('{}{}'.format('(dry run) ' if dry_run else '', change))
+
+        if dry_run:
+            transaction.set_rollback(True)
+        elif changes:
+            policy_cache.bump_generation()
+
+    return changes
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'foundry_backend.api'
+
+    def ready(self):
+        # connect the signals that keep the compiled IAM policies fresh
+        from .access import policy_cache  # noqa: F401
+
+        # and the signals that drop stale cached responses, bump listings' last_modified, geocode addresses and keep
+        # search rows and the text index in sync
+        from . import conditional, geo, listing_search, response_cache, text_search  # noqa: F401
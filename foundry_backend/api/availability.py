@@ -0,0 +1,57 @@
+import datetime
+from itertools import groupby
+from typing import Dict, Iterable, List, Tuple
+
+from foundry_backend.database import models
+
+Slot = Tuple[datetime.datetime, datetime.datetime]
+
+
+def free_slots(showings: Iterable[Slot], start: datetime.datetime, end: datetime.datetime,
+               duration: datetime.timedelta) -> List[Slot]:
+    """
+    Find the gaps between showings long enough for another showing, in one pass
+
+    :param showings: the (start, end) of the showings, sorted by start
+    :param start: the start of the time to search
+    :param end: the end of the time to search
+    :param duration: how long the showing needs to be
+    :return: the (start, end) of each gap, in order
+    """
+    slots = []
+    free_from = start
+
+    for showing_start, showing_end in showings:
+        if showing_start - free_from >= duration:
+            slots.append((free_from, showing_start))
+
+        # showings saved before conflicts were checked properly may overlap, so never step backwards
+        free_from = max(free_from, showing_end)
+
+    if end - free_from >= duration:
+        slots.append((free_from, end))
+
+    return slots
+
+
+def get_availability(listing_ids: Iterable[int], start: datetime.datetime, end: datetime.datetime,
+                     duration: datetime.timedelta) -> Dict[int, List[Slot]]:
+    """
+    Find the free slots of some listings, reading all of their showings in one query
+
+    :param listing_ids: the listings to search
+    :param start: the start of the time to search
+    :param end: the end of the time to search
+    :param duration: how long the showing needs to be
+    :return: each listing's free slots
+    """
+    showings = {listing_id: [] for listing_id in listing_ids}
+
+    # a range scan of the (listing, start_time, end_time) index, already in the order free_slots needs
+    rows = models.Showing.objects.filter(listing_id__in=showings, start_time__lt=end, end_time__gt=start) \
+        .order_by('listing_id', 'start_time').values_list('listing_id', 'start_time', 'end_time')
+
+    for listing_id, listing_showings in groupby(rows, key=lambda row: row[0]):
+        showings[listing_id] = [(showing_start, showing_end) for _, showing_start, showing_end in listing_showings]
+
+    return {listing_id: free_slots(showings[listing_id], start, end, duration) for listing_id in showings}
@@ -0,0 +1,89 @@
+from operator import attrgetter
+from typing import Callable, Iterable, List, Tuple
+
+from django.db import models
+from rest_framework import fields, relations, serializers
+from rest_framework.fields import SkipField
+
+
+def _plain(field: fields.Field) -> Callable:
+    # the commonest fields, with to_representation inlined
+    if type(field) is fields.CharField:
+        return lambda value: value if type(value) is str else str(value)
+    if type(field) is fields.IntegerField:
+        return int
+
+    return field.to_representation
+
+
+def _compile_field(field: fields.Field) -> Tuple[Callable, Callable]:
+    if isinstance(field, serializers.ListSerializer):
+        child = CompiledSerializer(field.child)
+        return attrgetter(field.source), child.many
+
+    if isinstance(field, serializers.BaseSerializer):
+        return attrgetter(field.source), CompiledSerializer(field).one
+
+    if isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None:
+        # read the foreign key column rather than loading the related object
+        source = field.source
+        return lambda instance: instance.serializable_value(source), lambda pk: pk
+
+    return attrgetter(field.source), _plain(field)
+
+
+class CompiledSerializer:
+    """
+    Renders objects exactly as a serializer would, without the serializer's per-field machinery
+
+    The serializer's readable fields are resolved once, up front, into a getter and a converter per field. Rendering
+    then only reads attributes and converts values, so read-only requests skip nested-writable setup, OrderedDicts and
+    the generic attribute lookup. Anything the fast path cannot read falls back to the field's own get_attribute.
+    """
+    def __init__(self, serializer: serializers.BaseSerializer):
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+
+        self._fields: List[Tuple[str, fields.Field, Callable, Callable]] = []
+
+        for field in serializer._readable_fields:
+            if field.source == '*' or len(field.source_attrs) != 1 or \
+                    isinstance(field, (relations.ManyRelatedField, relations.HyperlinkedRelatedField)):
+                getter, convert = field.get_attribute, field.to_representation
+            else:
+                getter, convert = _compile_field(field)
+
+            self._fields.append((field.field_name, field, getter, convert))
+
+    def one(self, instance) -> dict:
+        """
+        Render a single object
+        """
+        data = {}
+
+        for name, field, getter, convert in self._fields:
+            try:
+                value = getter(instance)
+            except (AttributeError, KeyError):
+                try:
+                    value = field.get_attribute(instance)
+                except SkipField:
+                    continue
+
+            if isinstance(value, relations.PKOnlyObject):
+                value = value if value.pk is not None else None
+
+            data[name] = None if value is None else convert(value)
+
+        return data
+
+    def many(self, instances: Iterable) -> List[dict]:
+        """
+        Render a list of objects, or a related manager
+        """
+        if isinstance(instances, models.Manager):
+            instances = instances.all()
+
+        one = self.one
+
+        return [one(instance) for instance in instances]
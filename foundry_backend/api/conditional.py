@@ -0,0 +1,87 @@
+import datetime
+from calendar import timegm
+from typing import Optional
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from foundry_backend.database import models
+
+# how to find the listings an object is nested in
+LISTING_LOOKUPS = {
+    models.Property: ('pk', 'listing_id'),
+    models.ListingImage: ('pk', 'listing_id'),
+    models.Room: ('property__pk', 'property_id'),
+    models.NearbyAttraction: ('property__pk', 'property_id'),
+    models.HomeAlarm: ('property__pk', 'property_id'),
+    models.Address: ('property__address_id', 'pk'),
+}
+
+
+def touch_listings(listings: QuerySet):
+    """
+    Move listings' last_modified to now, which changes their ETags so the next conditional read gets a full response
+    """
+    listings.update(last_modified=timezone.now())
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def _touch_listing(sender, instance, **kwargs):
+    if sender not in LISTING_LOOKUPS:
+        return
+
+    lookup, attribute = LISTING_LOOKUPS[sender]
+
+    touch_listings(models.Listing.objects.filter(**{lookup: getattr(instance, attribute)}))
+
+
+class ConditionalListingMixin:
+    """
+    Answers If-None-Match and If-Modified-Since on reads nested in a listing from its last_modified alone
+
+    Conditional requests for an unchanged listing get a 304 after one primary key lookup, before the queryset is built
+    or anything is serialized. Other reads get ETag and Last-Modified headers to send next time.
+    """
+    # the URL keyword argument holding the listing's id
+    listing_lookup_kwarg = 'pk'
+
+    # the actions that are answered conditionally
+    conditional_actions = ('retrieve',)
+
+    def get_listing_last_modified(self) -> Optional[datetime.datetime]:
+        return models.Listing.objects.filter(pk=self.kwargs.get(self.listing_lookup_kwarg)) \
+            .values_list('last_modified', flat=True).first()
+
+    def dispatch_conditionally(self, request, respond):
+        last_modified = self.get_listing_last_modified() if self.action in self.conditional_actions else None
+
+        if last_modified is None:
+            return respond()
+
+        timestamp = timegm(last_modified.utctimetuple())
+        etag = '"{}-{}"'.format(self.kwargs[self.listing_lookup_kwarg], int(last_modified.timestamp() * 1e6))
+
+        not_modified = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            return not_modified
+
+        response = respond()
+
+        if response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(timestamp)
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.dispatch_conditionally(
+            request, lambda: super(ConditionalListingMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.dispatch_conditionally(
+            request, lambda: super(ConditionalListingMixin, self).retrieve(request, *args, **kwargs))
@@ -1,17 +1,44 @@
 import datetime
 import logging
+from unittest.mock import patch
 
 import pytest
+from django.conf import settings
 from django.contrib.auth.models import User, Group
 from rest_framework.authtoken.models import Token
 
-from foundry_backend.api import startup
+from foundry_backend.api import hits, response_cache, startup
+from foundry_backend.api.access import policy_cache
 from foundry_backend.api.models import IAMPolicy, IAMPolicyStatement, IAMPolicyStatementPrincipal, \
     IAMPolicyStatementCondition
 from foundry_backend.database import models
 from foundry_backend.database.models import MLSNumber, Agency, Address, UserMessage
 
 
+@pytest.fixture(autouse=True, scope='session')
+def no_scheduler_autostart():
+    # importing the URLconf would otherwise start a scheduler leader in the test process, which takes the lease the
+    # lease tests compete for
+    settings.SCHEDULER_AUTOSTART = False
+
+
+@pytest.fixture(autouse=True)
+def clear_policy_cache():
+    # the database is rolled back between tests without firing any signals
+    policy_cache.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    # cached responses would otherwise outlive the rolled back rows they were built from
+    response_cache.get_cache().clear()
+
+
+@pytest.fixture
+def no_response_cache(settings):
+    settings.RESPONSE_CACHE = {**settings.RESPONSE_CACHE, 'ENABLED': False}
+
+
 @pytest.fixture
 def setup(db):
     startup.load_iam_policies(logging.getLogger('AccessPolicyManager'))
@@ -282,3 +309,24 @@ def policy(db):
                 ])
 
     return policy, data
+
+
+@pytest.fixture
+def listings_hit_policy(db):
+    policy = IAMPolicy.objects.create(name='listings-hit-access-policy', notes='Anyone can record a hit')
+    statement = IAMPolicyStatement.objects.create(policy=policy, actions=['create'], effect='allow')
+    IAMPolicyStatementPrincipal.objects.create(statement=statement, value='*')
+
+    return policy
+
+
+@pytest.fixture
+def hit_buffer(settings):
+    settings.LISTINGS_HIT_BUFFER = {'ENABLED': True, 'SIZE': 3, 'INTERVAL': 5}
+
+    buffer = hits.ListingsHitBuffer(3, 5, logging.getLogger('ListingsHits'))
+    # flush explicitly, rather than from a thread outside the test's transaction
+    buffer.start = lambda: None
+
+    with patch('foundry_backend.api.views.get_hit_buffer', return_value=buffer):
+        yield buffer
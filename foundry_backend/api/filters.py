@@ -1,30 +1,150 @@
+from typing import List
+
 import django_filters
+from django import forms
+from django.core.validators import EMPTY_VALUES
+from django.db.models import QuerySet
 
+from foundry_backend.api import geo
+from foundry_backend.api.text_search import search_listings
 from foundry_backend.database import models
 
 
+class CoordinatesField(forms.CharField):
+    """
+    Comma separated latitudes and longitudes, e.g. '34.73,-86.58'
+    """
+    def __init__(self, *args, order=('latitude', 'longitude'), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.order = order
+
+    def clean(self, value):
+        value = super().clean(value)
+
+        if value in EMPTY_VALUES:
+            return None
+
+        try:
+            numbers = tuple(float(number) for number in value.split(','))
+        except ValueError:
+            numbers = ()
+
+        if len(numbers) != len(self.order):
+            raise forms.ValidationError('Expected {}'.format(','.join(self.order)))
+
+        for name, number in zip(self.order, numbers):
+            if abs(number) > (90 if name.endswith('latitude') else 180):
+                raise forms.ValidationError('{} is not a {}'.format(number, name.replace('_', ' ')))
+
+        # a box's min corner must not be past its max corner
+        values = dict(zip(self.order, numbers))
+        for name, number in values.items():
+            maximum = 'max_' + name[len('min_'):]
+            if name.startswith('min_') and maximum in values and number > values[maximum]:
+                raise forms.ValidationError('{} cannot be greater than {}'.format(name.replace('_', ' '),
+                                                                                   maximum.replace('_', ' ')))
+
+        return numbers
+
+
+class CoordinatesFilter(django_filters.Filter):
+    field_class = CoordinatesField
+
+
 class ListingFilterSet(django_filters.FilterSet):
-    square_footage_min = django_filters.NumberFilter(field_name='property__square_footage', lookup_expr='gte')
-    square_footage = django_filters.NumberFilter(field_name='property__square_footage', lookup_expr='exact')
-    square_footage_max = django_filters.NumberFilter(field_name='property__square_footage', lookup_expr='lte')
+    """
+    Filters listings by their ListingSearch rows, so that a search reads one table rather than joining each listing to
+    its property and address
+    """
+    # filters on these alone are answered from the listing table's own indexes
+    LISTING_FIELDS = {'asking_price', 'open'}
+
+    square_footage_min = django_filters.NumberFilter(field_name='square_footage', lookup_expr='gte')
+    square_footage = django_filters.NumberFilter(field_name='square_footage', lookup_expr='exact')
+    square_footage_max = django_filters.NumberFilter(field_name='square_footage', lookup_expr='lte')
 
     asking_price_min = django_filters.NumberFilter(field_name='asking_price', lookup_expr='gte')
     asking_price = django_filters.NumberFilter(field_name='asking_price', lookup_expr='exact')
     asking_price_max = django_filters.NumberFilter(field_name='asking_price', lookup_expr='lte')
 
-    zip_code = django_filters.CharFilter(field_name='property__address__postal_code', lookup_expr='exact')
+    zip_code = django_filters.CharFilter(field_name='postal_code', lookup_expr='exact')
 
     open = django_filters.BooleanFilter(field_name='open', lookup_expr='exact')
 
+    bedrooms_min = django_filters.NumberFilter(field_name='bedrooms', lookup_expr='gte')
+    bathrooms_min = django_filters.NumberFilter(field_name='bathrooms', lookup_expr='gte')
+
+    near = CoordinatesFilter(method='filter_near', help_text='Show only listings within `radius` miles of lat,lon')
+    radius = django_filters.NumberFilter(min_value=0, max_value=500,
+                                         help_text='How far from `near` to search, in miles (5 by default)')
+    bbox = CoordinatesFilter(method='filter_bbox',
+                             order=('min_longitude', 'min_latitude', 'max_longitude', 'max_latitude'),
+                             help_text='Show only listings inside the box min_lon,min_lat,max_lon,max_lat')
+
+    q = django_filters.CharFilter(method='filter_text',
+                                  help_text='Show only listings whose description has every word, best matches first')
+
     class Meta:
         model = models.Listing
         fields = [
             'asking_price_min', 'asking_price', 'asking_price_max',
             'square_footage_min', 'square_footage', 'square_footage_max',
             'zip_code',
-            'open'
+            'open',
+            'bedrooms_min', 'bathrooms_min',
+            'near', 'radius', 'bbox',
+            'q'
         ]
 
+    def filter_near(self, queryset, name, value):
+        radius = self.form.cleaned_data.get('radius')
+        return geo.within(queryset, *value, float(5 if radius is None else radius))
+
+    def filter_bbox(self, queryset, name, value):
+        min_longitude, min_latitude, max_longitude, max_latitude = value
+        return geo.in_box(queryset, (min_latitude, min_longitude, max_latitude, max_longitude))
+
+    def filter_text(self, queryset, name, value):
+        return search_listings(queryset, value)
+
+    def get_used_filters(self) -> List[str]:
+        """
+        Get the names of the filters given a value, other than q and radius
+        """
+        # radius is only read by filter_near
+        return [name for name, value in self.form.cleaned_data.items()
+                if value not in EMPTY_VALUES and name not in ('q', 'radius')]
+
+    def filter_search(self, search: QuerySet) -> QuerySet:
+        """
+        Filter ListingSearch rows rather than listings
+        """
+        for name in self.get_used_filters():
+            search = self.filters[name].filter(search, self.form.cleaned_data[name])
+
+        text = self.form.cleaned_data.get('q')
+        if text not in EMPTY_VALUES:
+            search = search.filter(listing__in=search_listings(models.Listing.objects.all(), text))
+
+        return search
+
+    def filter_queryset(self, queryset):
+        data = self.form.cleaned_data
+        used = self.get_used_filters()
+
+        if all(self.filters[name].field_name in self.LISTING_FIELDS for name in used):
+            for name in used:
+                queryset = self.filters[name].filter(queryset, data[name])
+        else:
+            search = models.ListingSearch.objects.all()
+            for name in used:
+                search = self.filters[name].filter(search, data[name])
+
+            queryset = queryset.filter(pk__in=search.values('listing_id'))
+
+        # searched last, so that its ranking orders the results
+        return self.filters['q'].filter(queryset, data.get('q'))
+
 
 class ListingsHitFilterSet(django_filters.FilterSet):
     class Meta:
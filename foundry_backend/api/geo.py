@@ -0,0 +1,195 @@
+import math
+from typing import List, Optional, Tuple
+
+from django.db.models import ExpressionWrapper, F, FloatField, Q, QuerySet
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from foundry_backend.database import models
+
+# (min latitude, min longitude, max latitude, max longitude)
+Box = Tuple[float, float, float, float]
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# how many characters of geohash are stored, about 5m square
+PRECISION = 9
+
+MILES_PER_DEGREE_LATITUDE = 69.05
+
+
+def encode(latitude: float, longitude: float, precision: int = PRECISION) -> str:
+    """
+    Encode a point as a geohash, whose prefixes are the ever larger grid cells the point is in
+
+    :param latitude: the point's latitude
+    :param longitude: the point's longitude
+    :param precision: how many characters to encode
+    :return: the geohash
+    """
+    latitudes, longitudes = [-90.0, 90.0], [-180.0, 180.0]
+    characters, value, bits, even = [], 0, 0, True
+
+    while len(characters) < precision:
+        interval, coordinate = (longitudes, longitude) if even else (latitudes, latitude)
+        middle = (interval[0] + interval[1]) / 2
+
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+
+        even = not even
+        bits += 1
+
+        if bits == 5:
+            characters.append(BASE32[value])
+            value, bits = 0, 0
+
+    return ''.join(characters)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Get the (height, width) in degrees of the geohash cells with a number of characters
+    """
+    bits = precision * 5
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def cell_grid(box: Box, precision: int) -> Tuple[range, range]:
+    """
+    Get the rows and columns of the geohash cells with a number of characters that a box overlaps, numbered from the
+    equator and the prime meridian
+    """
+    min_latitude, min_longitude, max_latitude, max_longitude = box
+    height, width = cell_size(precision)
+
+    return range(math.floor(min_latitude / height), math.floor(max_latitude / height) + 1), \
+        range(math.floor(min_longitude / width), math.floor(max_longitude / width) + 1)
+
+
+def covering_cells(box: Box, max_cells: int = 16) -> List[str]:
+    """
+    Find the geohash cells that cover a box, as small as possible without needing more than `max_cells` of them
+
+    :param box: the box to cover
+    :param max_cells: the most cells to return
+    :return: the cells' geohashes
+    """
+    cells = ['']
+
+    for precision in range(1, PRECISION + 1):
+        height, width = cell_size(precision)
+        rows, columns = cell_grid(box, precision)
+
+        if len(rows) * len(columns) > max_cells:
+            break
+
+        # encode the middle of each cell, so that rounding never lands in a neighbour
+        cells = [encode((row + 0.5) * height, (column + 0.5) * width, precision) for row in rows for column in columns]
+
+    return cells
+
+
+def precision_for_zoom(zoom: int) -> int:
+    """
+    Get the geohash precision whose cells are at most a quarter of a 256 pixel map tile wide at a zoom level
+    """
+    # a tile is 360 / 2^zoom degrees wide, and a cell 360 / 2^ceil(5 * precision / 2)
+    return max(1, min(PRECISION, math.ceil(2 * (zoom + 2) / 5)))
+
+
+def precision_for_box(box: Box, max_cells: int) -> int:
+    """
+    Get the largest geohash precision that splits a box into at most `max_cells` cells, and at least 1
+    """
+    for precision in range(2, PRECISION + 1):
+        rows, columns = cell_grid(box, precision)
+
+        if len(rows) * len(columns) > max_cells:
+            return precision - 1
+
+    return PRECISION
+
+
+def box_around(latitude: float, longitude: float, radius: float) -> Box:
+    """
+    Get the box around a circle
+
+    :param latitude: the circle's centre
+    :param longitude: the circle's centre
+    :param radius: the circle's radius, in miles
+    """
+    height = radius / MILES_PER_DEGREE_LATITUDE
+    width = radius / (MILES_PER_DEGREE_LATITUDE * max(math.cos(math.radians(latitude)), 0.01))
+
+    return latitude - height, longitude - width, latitude + height, longitude + width
+
+
+def in_box(queryset: QuerySet, box: Box) -> QuerySet:
+    """
+    Filter rows with latitude, longitude and geohash columns to those inside a box
+
+    The geohash cells covering the box turn the search into a few range scans of the geohash index. The exact bounds
+    then drop the rows in the parts of those cells outside the box.
+
+    :param queryset: the rows to filter
+    :param box: the box to keep the rows in
+    """
+    cells = Q()
+    for cell in covering_cells(box):
+        # '~' sorts after every geohash character, and unlike startswith, a range can use the index on SQLite
+        cells |= Q(geohash__gte=cell, geohash__lt=cell + '~')
+
+    min_latitude, min_longitude, max_latitude, max_longitude = box
+
+    return queryset.filter(cells, latitude__gte=min_latitude, latitude__lte=max_latitude,
+                           longitude__gte=min_longitude, longitude__lte=max_longitude)
+
+
+def within(queryset: QuerySet, latitude: float, longitude: float, radius: float) -> QuerySet:
+    """
+    Filter rows with latitude, longitude and geohash columns to those within a distance of a point
+
+    Distances are measured on a flat projection around the point, which is well within a percent at city scales.
+
+    :param queryset: the rows to filter
+    :param latitude: the point's latitude
+    :param longitude: the point's longitude
+    :param radius: the distance, in miles
+    """
+    miles_per_degree_longitude = MILES_PER_DEGREE_LATITUDE * math.cos(math.radians(latitude))
+
+    north = (F('latitude') - latitude) * MILES_PER_DEGREE_LATITUDE
+    east = (F('longitude') - longitude) * miles_per_degree_longitude
+
+    return in_box(queryset, box_around(latitude, longitude, radius)) \
+        .annotate(distance_squared=ExpressionWrapper(north * north + east * east, output_field=FloatField())) \
+        .filter(distance_squared__lte=radius * radius)
+
+
+def place(address: models.Address, centroid: Optional[models.ZipCentroid]):
+    """
+    Place an address at the centre of its zip code, or nowhere if the zip code is unknown
+    """
+    if centroid is None:
+        address.latitude = address.longitude = address.geohash = None
+    else:
+        address.latitude, address.longitude = centroid.latitude, centroid.longitude
+        address.geohash = encode(centroid.latitude, centroid.longitude)
+
+
+def geocode(address: models.Address):
+    """
+    Place an address at the centre of its zip code, if the zip code is known
+    """
+    place(address, models.ZipCentroid.objects.filter(postal_code=address.postal_code).first())
+
+
+@receiver(pre_save, sender=models.Address)
+def _geocode_address(sender, instance, raw=False, **kwargs):
+    if not raw:
+        geocode(instance)
@@ -0,0 +1,178 @@
+import atexit
+import datetime
+import logging
+import threading
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from foundry_backend.database import models
+
+
+def record_daily_hits(hits: Iterable[models.ListingsHit]):
+    """
+    Add hits to the per-day totals in ListingHitDaily
+
+    Each (listing, day) pair costs one UPDATE, plus an INSERT the first time the listing is seen that day.
+
+    :param hits: the hits that were just written
+    """
+    totals = Counter((hit.listing_id, timezone.localdate(hit.access_time)) for hit in hits)
+
+    for (listing_id, date), count in totals.items():
+        daily_hits = models.ListingHitDaily.objects.filter(listing_id=listing_id, date=date)
+
+        if daily_hits.update(count=F('count') + count):
+            continue
+
+        try:
+            with transaction.atomic():
+                models.ListingHitDaily.objects.create(listing_id=listing_id, date=date, count=count)
+        except IntegrityError:
+            # another worker created the row first
+            daily_hits.update(count=F('count') + count)
+
+
+class ListingsHitBuffer:
+    """
+    Collects listing hits in memory and writes them with bulk_create
+
+    A background thread flushes the buffer every `interval` seconds, or as soon as it holds `size` hits. Whatever is
+    left is flushed when the process exits. Hits that fail to write are queued again for the next flush, keeping at
+    most `max_size` of the newest.
+    """
+    def __init__(self, size: int, interval: float, logger: logging.Logger, max_size: Optional[int] = None):
+        self.size = size
+        self.interval = interval
+        self.max_size = max_size or size * 10
+        self.logger = logger
+
+        self._hits: List[models.ListingsHit] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self):
+        return len(self._hits)
+
+    def add(self, listing_id: int, access_time: Optional[datetime.datetime] = None):
+        """
+        Queue a hit for writing
+
+        :param listing_id: the listing that was viewed
+        :param access_time: when it was viewed, defaulting to now
+        """
+        with self._lock:
+            self._hits.append(models.ListingsHit(listing_id=listing_id, access_time=access_time or timezone.now()))
+            full = len(self._hits) >= self.size
+
+        self.start()
+
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Write every queued hit
+
+        :return: the number of hits written
+        """
+        with self._lock:
+            hits, self._hits = self._hits, []
+
+        if not hits:
+            return 0
+
+        try:
+            return self._write(hits)
+        except Exception:
+            self._requeue(hits)
+            raise
+
+    def _write(self, hits: List[models.ListingsHit]) -> int:
+        # a listing may have been deleted while its hits were queued; foreign keys are only checked on commit, so
+        # drop those hits up front rather than fail the whole batch
+        listing_ids = set(models.Listing.objects.filter(id__in={hit.listing_id for hit in hits})
+                          .values_list('id', flat=True))
+        hits = [hit for hit in hits if hit.listing_id in listing_ids]
+
+        with transaction.atomic():
+            models.ListingsHit.objects.bulk_create(hits, batch_size=self.size)
+            record_daily_hits(hits)
+
+        self.logger.debug('Wrote {} listing hits'.format(len(hits)))
+
+        return len(hits)
+
+    def _requeue(self, hits: List[models.ListingsHit]):
+        with self._lock:
+            # the failed hits are older than any added since, so they go first, and are the first dropped
+            self._hits = hits + self._hits
+            dropped = max(0, len(self._hits) - self.max_size)
+            del self._hits[:dropped]
+
+        if dropped:
+            self.logger.warning('Dropped {} listing hits that could not be written'.format(dropped))
+
+    def start(self):
+        """
+        Start the background flusher, if it is not already running
+        """
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ListingsHitBuffer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self):
+        """
+        Stop the background flusher and write anything still queued
+        """
+        self._stopped.set()
+        self._wake.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+            close_old_connections()
+
+            try:
+                self.flush()
+            except Exception:
+                self.logger.exception('Failed to write listing hits')
+
+
+_buffer: Optional[ListingsHitBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_hit_buffer() -> ListingsHitBuffer:
+    """
+    Get this process's hit buffer, configured from LISTINGS_HIT_BUFFER
+    """
+    global _buffer
+
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ListingsHitBuffer(settings.LISTINGS_HIT_BUFFER['SIZE'],
+                                            settings.LISTINGS_HIT_BUFFER['INTERVAL'],
+                                            logging.getLogger('ListingsHits'),
+                                            settings.LISTINGS_HIT_BUFFER.get('MAX_SIZE'))
+
+    return _buffer
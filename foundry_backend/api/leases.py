@@ -0,0 +1,49 @@
+import datetime
+import os
+import socket
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from foundry_backend.api.models import Lease
+
+
+def get_owner() -> str:
+    """
+    Identify this process to other processes competing for a lease
+    """
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def acquire_lease(name: str, owner: str, seconds: float) -> bool:
+    """
+    Take or renew a lease
+
+    :param name: the name of the lease
+    :param owner: who wants it
+    :param seconds: how long to hold it for
+    :return: True if `owner` now holds the lease
+    """
+    now = timezone.now()
+    expires = now + datetime.timedelta(seconds=seconds)
+
+    if Lease.objects.filter(name=name).filter(Q(owner=owner) | Q(expires__lt=now)).update(owner=owner,
+                                                                                         expires=expires):
+        return True
+
+    try:
+        with transaction.atomic():
+            Lease.objects.create(name=name, owner=owner, expires=expires)
+    except IntegrityError:
+        # someone else holds it
+        return False
+
+    return True
+
+
+def release_lease(name: str, owner: str):
+    """
+    Give up a lease, if `owner` holds it
+    """
+    Lease.objects.filter(name=name, owner=owner).delete()
@@ -0,0 +1,143 @@
+from decimal import Decimal
+from typing import List
+
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q, QuerySet
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foundry_backend.api.nightly.chunked import get_chunks
+from foundry_backend.database import models
+
+# how to find the listings whose search rows an object appears in
+SEARCH_LOOKUPS = {
+    models.Listing: ('pk', 'pk'),
+    models.Property: ('pk', 'listing_id'),
+    models.Room: ('property__pk', 'property_id'),
+    models.Address: ('property__address_id', 'pk'),
+}
+
+
+def _count_rooms(room_type: str) -> Count:
+    return Count('property__rooms', filter=Q(property__rooms__type=room_type))
+
+
+def get_search_rows(listings: QuerySet) -> List[models.ListingSearch]:
+    """
+    Flatten listings into search rows, in one query
+
+    :param listings: the listings to flatten
+    :return: an unsaved ListingSearch per listing
+    """
+    listings = listings.order_by().annotate(
+        bedrooms=_count_rooms('BEDROOM'),
+        full_bathrooms=_count_rooms('BATHROOM'),
+        half_bathrooms=_count_rooms('HALF_BATHROOM'),
+    ).values('id', 'asking_price', 'open', 'date_posted', 'property__square_footage', 'property__acreage',
+             'property__type', 'property__address__postal_code', 'property__address__locality',
+             'property__address__state_code', 'property__address__latitude', 'property__address__longitude',
+             'property__address__geohash', 'bedrooms', 'full_bathrooms', 'half_bathrooms')
+
+    return [
+        models.ListingSearch(
+            listing_id=listing['id'],
+            asking_price=listing['asking_price'],
+            open=listing['open'],
+            date_posted=listing['date_posted'],
+            square_footage=listing['property__square_footage'],
+            acreage=listing['property__acreage'],
+            type=listing['property__type'],
+            postal_code=listing['property__address__postal_code'],
+            locality=listing['property__address__locality'],
+            state_code=listing['property__address__state_code'],
+            bedrooms=listing['bedrooms'],
+            bathrooms=listing['full_bathrooms'] + Decimal('0.5') * listing['half_bathrooms'],
+            latitude=listing['property__address__latitude'],
+            longitude=listing['property__address__longitude'],
+            geohash=listing['property__address__geohash'],
+        )
+        for listing in listings
+    ]
+
+
+def cluster_listings(search: QuerySet, precision: int) -> List[dict]:
+    """
+    Group search rows by the geohash cell they are in
+
+    :param search: the ListingSearch rows to group
+    :param precision: how many characters of geohash to group by
+    :return: each cell's listing count, centroid and price range, and its listing if it has only one
+    """
+    cells = search.exclude(geohash=None).annotate(cell=Substr('geohash', 1, precision)).values('cell').annotate(
+        count=Count('pk'),
+        centroid_latitude=Avg('latitude'),
+        centroid_longitude=Avg('longitude'),
+        min_price=Min('asking_price'),
+        max_price=Max('asking_price'),
+        first_listing=Min('pk'),
+    ).order_by('cell')
+
+    return [
+        {
+            'geohash': cell['cell'],
+            'count': cell['count'],
+            'latitude': cell['centroid_latitude'],
+            'longitude': cell['centroid_longitude'],
+            'min_price': cell['min_price'],
+            'max_price': cell['max_price'],
+            'listing': cell['first_listing'] if cell['count'] == 1 else None,
+        }
+        for cell in cells
+    ]
+
+
+def refresh_listing_search(listings: QuerySet) -> int:
+    """
+    Rewrite the search rows of some listings
+
+    :param listings: the listings to rewrite the rows of
+    :return: how many rows were written
+    """
+    rows = get_search_rows(listings)
+
+    with transaction.atomic():
+        models.ListingSearch.objects.filter(listing_id__in=[row.listing_id for row in rows]).delete()
+        models.ListingSearch.objects.bulk_create(rows)
+
+    return len(rows)
+
+
+def rebuild_listing_search(chunk_size: int = 1000) -> int:
+    """
+    Rewrite every listing's search row, a chunk of listings at a time
+
+    :param chunk_size: how many listing ids to rewrite at once
+    :return: how many rows were written
+    """
+    written = 0
+
+    with transaction.atomic():
+        models.ListingSearch.objects.all().delete()
+
+        for start, end in get_chunks(models.Listing.objects.all(), chunk_size):
+            written += refresh_listing_search(models.Listing.objects.filter(pk__gte=start, pk__lt=end))
+
+    return written
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def _refresh_search_rows(sender, instance, **kwargs):
+    if sender not in SEARCH_LOOKUPS:
+        return
+
+    lookup, attribute = SEARCH_LOOKUPS[sender]
+
+    refresh_listing_search(models.Listing.objects.filter(**{lookup: getattr(instance, attribute)}))
+
+
+@receiver(post_delete, sender=models.Listing)
+def _delete_search_row(sender, instance, **kwargs):
+    # deleting a listing deletes its property first, which writes the row again while the listing still exists
+    models.ListingSearch.objects.filter(listing_id=instance.pk).delete()
@@ -0,0 +1,109 @@
+import json
+import os
+import timeit
+from types import SimpleNamespace
+from typing import List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_access_policy import AccessPolicy
+
+from foundry_backend.api.access.compiled_policy import CompiledPolicy
+from foundry_backend.api.models import serialize_actions
+
+USERS = [
+    SimpleNamespace(id=None, is_anonymous=True, groups=[]),
+    SimpleNamespace(id=1, is_anonymous=False, groups=[]),
+    SimpleNamespace(id=2, is_anonymous=False, groups=['realtor']),
+    SimpleNamespace(id=3, is_anonymous=False, groups=['admin']),
+]
+
+ACTIONS = [
+    ('list', 'GET'),
+    ('retrieve', 'GET'),
+    ('create', 'POST'),
+    ('update', 'PUT'),
+    ('partial_update', 'PATCH'),
+    ('destroy', 'DELETE'),
+]
+
+
+def _condition(request, view, action, arg=None) -> bool:
+    # conditions hit the database in production; both paths share this stand-in, so only matching is measured
+    return True
+
+
+class _StatementPolicy(AccessPolicy):
+    """
+    The stock drf-access-policy evaluation, over plain statement dicts
+    """
+    def get_user_group_values(self, user) -> List[str]:
+        return user.groups
+
+    def _get_condition_method(self, method_name: str):
+        return _condition
+
+
+def load_policy_statements(path: str) -> dict:
+    """
+    Read a permissions JSON file into serialized statements, as IAMPolicy.serialize would produce them
+
+    :param path: the path to the permissions file
+    :return: a mapping of policy name to statement list
+    """
+    with open(path, 'r') as permissions_file:
+        permissions_data = json.loads(permissions_file.read())
+
+    return {
+        policy['name']: [
+            {
+                'notes': statement.get('notes'),
+                'effect': statement['effect'],
+                'action': serialize_actions(statement['actions']),
+                'principal': [principal['value'] for principal in statement['principals']],
+                'condition': [condition['value'] for condition in statement['conditions']]
+            } for statement in policy['statements']
+        ] for policy in permissions_data
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare compiled IAM policy evaluation against drf-access-policy for every policy in a permissions file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=os.path.join(settings.BASE_DIR, settings.PERMISSIONS_JSON),
+                            help='The permissions JSON file to benchmark')
+        parser.add_argument('--iterations', type=int, default=1000,
+                            help='How many times to evaluate every request against every policy')
+
+    def handle(self, *args, **options):
+        policies = load_policy_statements(options['path'])
+
+        requests = [(SimpleNamespace(user=user, method=method), SimpleNamespace(action=action), action)
+                    for user in USERS for action, method in ACTIONS]
+
+        stock_policy = _StatementPolicy()
+        compiled_policies = {name: CompiledPolicy(statements, lambda _: _condition)
+                             for name, statements in policies.items()}
+
+        def run_stock():
+            return [stock_policy._evaluate_statements(statements, request, view, action)
+                    for statements in policies.values() for request, view, action in requests]
+
+        def run_compiled():
+            return [compiled.has_permission(stock_policy, request, view, action)
+                    for compiled in compiled_policies.values() for request, view, action in requests]
+
+        if run_stock() != run_compiled():
+            raise CommandError('Compiled policies disagree with drf-access-policy')
+
+        stock_time = timeit.timeit(run_stock, number=options['iterations'])
+        compiled_time = timeit.timeit(run_compiled, number=options['iterations'])
+        checks = options['iterations'] * len(policies) * len(requests)
+
+        self.stdout.write('{} policies, {} permission checks'.format(len(policies), checks))
+        self.stdout.write('drf-access-policy: {:.3f}s ({:.2f}us per check)'.format(
+            stock_time, stock_time / checks * 1e6))
+        self.stdout.write('compiled:          {:.3f}s ({:.2f}us per check)'.format(
+            compiled_time, compiled_time / checks * 1e6))
+        self.stdout.write('speedup:           {:.1f}x'.format(stock_time / compiled_time))
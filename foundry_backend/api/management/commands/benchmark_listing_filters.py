@@ -0,0 +1,125 @@
+import datetime
+import random
+import timeit
+from decimal import Decimal
+from typing import Callable
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from foundry_backend.api.filters import ListingFilterSet
+from foundry_backend.api.geo import encode
+from foundry_backend.api.listing_search import refresh_listing_search
+from foundry_backend.database import models
+
+# the searches the listing page makes, as query parameters
+SEARCHES = [
+    ('open, price range', {'open': True, 'asking_price_min': 200000, 'asking_price_max': 250000}),
+    ('price range', {'asking_price_min': 200000, 'asking_price_max': 250000}),
+    ('square footage range', {'square_footage_min': 2000, 'square_footage_max': 2100}),
+    ('zip code', {'zip_code': '35805'}),
+    ('open, zip code, price range', {'open': True, 'zip_code': '35805', 'asking_price_min': 200000,
+                                     'asking_price_max': 400000}),
+    ('within 2 miles', {'near': '34.73,-86.59', 'radius': 2}),
+    ('map viewport', {'bbox': '-86.65,34.70,-86.55,34.75'}),
+]
+
+# listings are spread over a square this many degrees across, centred on Huntsville
+SPREAD = 0.6
+CENTRE = (34.73, -86.59)
+
+BATCH_SIZE = 5000
+
+
+def _next_id(model) -> int:
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def seed_listings(count: int, seed: int = 0, describe: Callable[[random.Random, int], str] = None):
+    """
+    Seed listings, each with a property and an address, spread over 100 zip codes and a range of prices and sizes
+
+    :param count: how many listings to seed
+    :param seed: the seed for the random prices and sizes
+    :param describe: writes the description of a listing, from the random generator and its index
+    """
+    generator = random.Random(seed)
+
+    user = User.objects.create_user(username='benchmark_realtor_{}'.format(_next_id(User)))
+    address = models.Address.objects.create(street_number='1', street='Benchmark Agency Way', locality='Huntsville',
+                                            postal_code='35801', state='Alabama', state_code='AL')
+    agency = models.Agency.objects.create(name='Benchmark Agency {}'.format(address.id), address=address,
+                                          phone='+12025550143')
+    agent = models.MLSNumber.objects.create(user=user, agency=agency)
+
+    # explicit ids, so that properties can point at rows bulk_create does not return the ids of
+    first_listing, first_address = _next_id(models.Listing), _next_id(models.Address)
+    now = timezone.now()
+
+    for start in range(0, count, BATCH_SIZE):
+        indexes = range(start, min(start + BATCH_SIZE, count))
+
+        points = [(CENTRE[0] + (generator.random() - 0.5) * SPREAD, CENTRE[1] + (generator.random() - 0.5) * SPREAD)
+                  for _ in indexes]
+
+        models.Address.objects.bulk_create([
+            models.Address(id=first_address + index, street_number=str(index % 10000),
+                           street='Benchmark Street {}'.format(index // 10000), locality='Huntsville',
+                           postal_code=str(35800 + index % 100), state='Alabama', state_code='AL',
+                           latitude=latitude, longitude=longitude, geohash=encode(latitude, longitude))
+            for index, (latitude, longitude) in zip(indexes, points)
+        ])
+        models.Listing.objects.bulk_create([
+            models.Listing(id=first_listing + index, asking_price=generator.randrange(50000, 1000000, 1000),
+                           description=describe(generator, index) if describe else 'Benchmark listing {}'.format(index),
+                           agent=agent, open=generator.random() < 0.7, last_modified=now,
+                           date_posted=now - datetime.timedelta(minutes=index))
+            for index in indexes
+        ])
+        models.Property.objects.bulk_create([
+            models.Property(listing_id=first_listing + index, address_id=first_address + index,
+                            square_footage=generator.randrange(500, 5000), acreage=Decimal('0.25'), type='HOUSE')
+            for index in indexes
+        ])
+
+        refresh_listing_search(models.Listing.objects.filter(id__gte=first_listing + indexes.start,
+                                                             id__lt=first_listing + indexes.stop))
+
+
+class Command(BaseCommand):
+    help = 'Seed listings and record the query plan and timings of the common listing searches. ' \
+           'Everything seeded is rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='How many listings to seed')
+        parser.add_argument('--iterations', type=int, default=10, help='How many times to run each search')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write('Seeding {} listings...'.format(options['count']))
+            seed_listings(options['count'])
+
+            # give the planner the statistics a long-lived database would have
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            for name, params in SEARCHES:
+                queryset = ListingFilterSet(params, queryset=models.Listing.objects.all()).qs \
+                    .order_by('-date_posted', '-id')
+
+                def first_page():
+                    return list(queryset.values_list('id', flat=True)[:20])
+
+                page_time = timeit.timeit(first_page, number=options['iterations']) / options['iterations']
+                count_time = timeit.timeit(queryset.count, number=options['iterations']) / options['iterations']
+
+                self.stdout.write('{} ({} matches):'.format(name, queryset.count()))
+                self.stdout.write('  first page: {:.2f}ms'.format(page_time * 1e3))
+                self.stdout.write('  count: {:.2f}ms'.format(count_time * 1e3))
+                for line in queryset.values_list('id', flat=True)[:20].explain().splitlines():
+                    self.stdout.write('  | {}'.format(line))
+
+            transaction.set_rollback(True)
@@ -0,0 +1,109 @@
+import datetime
+import json
+import timeit
+from decimal import Decimal
+from typing import List
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from foundry_backend.api import serializers
+from foundry_backend.api.compiled_serializer import CompiledSerializer
+from foundry_backend.database import models
+
+
+def _prefetched(instance, **related):
+    # stands in for prefetch_related, so that only serialization is measured
+    instance._prefetched_objects_cache = related
+    return instance
+
+
+def build_listings(count: int) -> List[models.Listing]:
+    """
+    Build listings in memory, with their property, address, rooms and nearby attractions already loaded
+
+    :param count: how many listings to build
+    """
+    listings = []
+
+    for index in range(count):
+        address = models.Address(id=index, street_number=str(index), street='Benchmark Drive', locality='Huntsville',
+                                 postal_code='35801', state='Alabama', state_code='AL')
+        listing = models.Listing(id=index, asking_price=100000 + index, description='Listing {}'.format(index),
+                                 agent_id=1, date_posted=timezone.now() - datetime.timedelta(days=index), open=True)
+        prop = models.Property(id=index, listing=listing, address=address, square_footage=2000,
+                               acreage=Decimal('1.25'), type='HOUSE')
+
+        rooms = [models.Room(id=index * 10 + room, property=prop, name='Room {}'.format(room), type='BEDROOM',
+                             square_footage=150, description=None) for room in range(4)]
+        attractions = [models.NearbyAttraction(id=index * 10 + attraction, property=prop, type='SCHOOL_ELEM',
+                                               name='School {}'.format(attraction)) for attraction in range(2)]
+
+        _prefetched(prop, rooms=rooms, nearby_attractions=attractions)
+        listing.property = prop
+        listings.append(listing)
+
+    return listings
+
+
+def build_agencies(count: int) -> List[models.Agency]:
+    """
+    Build agencies in memory, each with a few realtors already loaded
+
+    :param count: how many agencies to build
+    """
+    agencies = []
+
+    for index in range(count):
+        address = models.Address(id=index, street_number=str(index), street='Benchmark Drive', locality='Huntsville',
+                                 postal_code='35801', state='Alabama', state_code='AL')
+        agency = models.Agency(id=index, name='Agency {}'.format(index), address=address, phone='+12025550143')
+
+        mls_numbers = []
+        for realtor in range(3):
+            user = User(id=index * 10 + realtor, username='realtor_{}_{}'.format(index, realtor),
+                        email='realtor@email.com', first_name='Realtor', last_name=str(realtor))
+            mls_numbers.append(models.MLSNumber(id=user.id, number=str(user.id), agency=agency, user=user))
+
+        agencies.append(_prefetched(agency, mls_numbers=mls_numbers))
+
+    return agencies
+
+
+class Command(BaseCommand):
+    help = 'Compare compiled serializers against the nested serializers for listing and agency reads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100, help='How many objects to serialize each time')
+        parser.add_argument('--iterations', type=int, default=100,
+                            help='How many times to serialize every object')
+
+    def handle(self, *args, **options):
+        cases = [
+            ('listings', serializers.ListingSerializer, build_listings(options['count'])),
+            ('agencies', serializers.AgencySerializer, build_agencies(options['count'])),
+        ]
+
+        renderer = JSONRenderer()
+
+        for name, serializer_class, objects in cases:
+            compiled = CompiledSerializer(serializer_class())
+
+            def run_serializer():
+                return serializer_class(objects, many=True).data
+
+            def run_compiled():
+                return compiled.many(objects)
+
+            if json.loads(renderer.render(run_serializer())) != json.loads(renderer.render(run_compiled())):
+                raise CommandError('The compiled {} serializer renders different JSON'.format(name))
+
+            serializer_time = timeit.timeit(run_serializer, number=options['iterations']) / options['iterations']
+            compiled_time = timeit.timeit(run_compiled, number=options['iterations']) / options['iterations']
+
+            self.stdout.write('{} ({} per request):'.format(name, options['count']))
+            self.stdout.write('  {}: {:.2f}ms'.format(serializer_class.__name__, serializer_time * 1e3))
+            self.stdout.write('  compiled: {:.2f}ms'.format(compiled_time * 1e3))
+            self.stdout.write('  speedup: {:.1f}x'.format(serializer_time / compiled_time))
@@ -0,0 +1,64 @@
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foundry_backend.api.management.commands.benchmark_listing_filters import seed_listings
+from foundry_backend.api.text_search import rebuild_text_index, search_listings
+from foundry_backend.database import models
+
+# what descriptions are written from, with a few rare words among the common ones
+WORDS = ['spacious', 'bright', 'kitchen', 'bedroom', 'bathroom', 'garage', 'yard', 'updated', 'quiet', 'street',
+         'close', 'schools', 'shopping', 'family', 'room', 'basement', 'deck', 'porch', 'fireplace', 'view',
+         'hardwood', 'floors', 'pool', 'granite', 'countertops', 'fenced', 'corner', 'lot', 'new', 'roof']
+RARE_WORDS = ['cul-de-sac', 'sunroom', 'wine cellar', 'solar panels', 'greenhouse']
+
+SEARCHES = ['pool', 'hardwood floors', 'cul-de-sac', 'pool garage fireplace', 'wine cellar']
+
+
+def describe(generator: random.Random, index: int) -> str:
+    words = generator.choices(WORDS, k=40)
+
+    if generator.random() < 0.05:
+        words.insert(generator.randrange(len(words)), generator.choice(RARE_WORDS))
+
+    return ' '.join(words).capitalize() + '.'
+
+
+class Command(BaseCommand):
+    help = 'Seed listings and compare searching their descriptions through the text index against icontains. ' \
+           'Everything seeded is rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='How many listings to seed')
+        parser.add_argument('--iterations', type=int, default=10, help='How many times to run each search')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write('Seeding {} listings...'.format(options['count']))
+            seed_listings(options['count'], describe=describe)
+
+            self.stdout.write('Indexed {} listings in {:.2f}s'.format(
+                models.Listing.objects.count(), timeit.timeit(rebuild_text_index, number=1)))
+
+            for text in SEARCHES:
+                indexed = search_listings(models.Listing.objects.all(), text)
+
+                scanned = models.Listing.objects.all()
+                for word in text.split():
+                    scanned = scanned.filter(description__icontains=word)
+
+                self.stdout.write('{!r} ({} matches):'.format(text, indexed.count()))
+
+                for name, queryset in (('index', indexed), ('icontains', scanned)):
+                    def first_page():
+                        return list(queryset.values_list('id', flat=True)[:20])
+
+                    page_time = timeit.timeit(first_page, number=options['iterations']) / options['iterations']
+                    count_time = timeit.timeit(queryset.count, number=options['iterations']) / options['iterations']
+
+                    self.stdout.write('  {}: first page {:.2f}ms, count {:.2f}ms'.format(
+                        name, page_time * 1e3, count_time * 1e3))
+
+            transaction.set_rollback(True)
@@ -0,0 +1,15 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from foundry_backend.api.startup import bootstrap
+
+
+class Command(BaseCommand):
+    help = 'Load the IAM policies, if the permissions file has changed, and make sure the admin user exists'
+
+    def handle(self, *args, **options):
+        if bootstrap(logging.getLogger('AccessPolicyManager')):
+            self.stdout.write('Loaded the authentication policies')
+        else:
+            self.stdout.write('The authentication policies are up to date')
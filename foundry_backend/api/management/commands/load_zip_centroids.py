@@ -0,0 +1,76 @@
+import csv
+import hashlib
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foundry_backend.api.conditional import touch_listings
+from foundry_backend.api.geo import place
+from foundry_backend.api.listing_search import refresh_listing_search
+from foundry_backend.api.response_cache import invalidate_model
+from foundry_backend.database import models
+
+
+class Command(BaseCommand):
+    help = 'Load zip code centroids from a ZCTA gazetteer file, and place every address at its zip code\'s centroid'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='The gazetteer file, ZIP_CENTROIDS_FILE by default')
+        parser.add_argument('--force', action='store_true',
+                            help='Load the file even if it is the one the centroids were last loaded from')
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.ZIP_CENTROIDS_FILE
+
+        with open(path, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+
+        source, _ = models.ZipCentroidSource.objects.get_or_create(pk=models.ZipCentroidSource.SOURCE_ID)
+
+        if source.source_hash == digest and not options['force']:
+            self.stdout.write('Zip code centroids are up to date')
+            return
+
+        with open(path, newline='') as file:
+            reader = csv.DictReader(file, delimiter='\t')
+            # the gazetteer pads its last column name with spaces
+            reader.fieldnames = [name.strip() for name in reader.fieldnames]
+
+            try:
+                centroids = [models.ZipCentroid(postal_code=row['GEOID'].strip(), latitude=float(row['INTPTLAT']),
+                                                longitude=float(row['INTPTLONG'])) for row in reader]
+            except (KeyError, ValueError) as e:
+                raise CommandError('{} is not a ZCTA gazetteer file: {}'.format(path, e))
+
+        with transaction.atomic():
+            models.ZipCentroid.objects.all().delete()
+            models.ZipCentroid.objects.bulk_create(centroids, batch_size=1000)
+
+            by_postal_code = {centroid.postal_code: centroid for centroid in centroids}
+
+            moved = []
+            for address in models.Address.objects.all():
+                before = address.geohash
+                place(address, by_postal_code.get(address.postal_code))
+
+                if address.geohash != before:
+                    moved.append(address)
+
+            models.Address.objects.bulk_update(moved, ['latitude', 'longitude', 'geohash'], batch_size=1000)
+
+            # bulk_update fires no signals, so do what saving each address would have
+            for start in range(0, len(moved), 1000):
+                ids = [address.id for address in moved[start:start + 1000]]
+                listings = models.Listing.objects.filter(property__address__in=ids)
+
+                refresh_listing_search(listings)
+                touch_listings(listings)
+
+            if moved:
+                invalidate_model(models.Address)
+
+            # remember what was loaded, so the next load of the same file can be skipped
+            models.ZipCentroidSource.objects.filter(pk=source.pk).update(source_hash=digest)
+
+        self.stdout.write('Loaded {} zip codes and moved {} addresses'.format(len(centroids), len(moved)))
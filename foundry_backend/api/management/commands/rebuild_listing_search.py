@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from foundry_backend.api.listing_search import rebuild_listing_search
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the search row of every listing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='How many listings to rewrite at once')
+
+    def handle(self, *args, **options):
+        written = rebuild_listing_search(options['chunk_size'])
+
+        self.stdout.write('Rebuilt the search rows of {} listings'.format(written))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from foundry_backend.api.text_search import is_indexed, rebuild_text_index
+
+
+class Command(BaseCommand):
+    help = 'Reindex the description of every listing for text search'
+
+    def handle(self, *args, **options):
+        if not is_indexed():
+            self.stdout.write('This database has no text index, descriptions are searched without one')
+            return
+
+        self.stdout.write('Indexed the descriptions of {} listings'.format(rebuild_text_index()))
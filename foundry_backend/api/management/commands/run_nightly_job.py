@@ -0,0 +1,29 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foundry_backend.api.nightly.resume import JOBS, resume_unfinished_runs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Do a run of a nightly job now, or finish every run of it that stopped part way'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job', choices=sorted(JOBS), help='The job to run')
+        parser.add_argument('--run', help='The run to do or finish, e.g. the date 2020-01-31 for gather_daily_views. '
+                                          'Without it, every unfinished run of the job is finished')
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger('ScheduleBatchTasks')
+
+        if options['run'] is None:
+            resumed = resume_unfinished_runs(logger, options['job'])
+            self.stdout.write('Finished {} unfinished runs of \'{}\''.format(resumed, options['job']))
+            return
+
+        try:
+            written = run_job(options['job'], options['run'], logger)
+        except ValueError as e:
+            raise CommandError('Invalid run \'{}\': {}'.format(options['run'], e))
+
+        self.stdout.write('Ran \'{}\' ({}): {}'.format(options['job'], options['run'], written))
@@ -0,0 +1,22 @@
+import logging
+import signal
+
+from django.core.management.base import BaseCommand
+
+from foundry_backend.api.startup import SchedulerLeader
+
+
+class Command(BaseCommand):
+    help = 'Run the nightly tasks in this process, taking over from any other scheduler that stops'
+
+    def handle(self, *args, **options):
+        leader = SchedulerLeader(logging.getLogger('ScheduleBatchTasks'))
+
+        signal.signal(signal.SIGTERM, lambda *_: leader.stop())
+
+        try:
+            leader.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            leader.stop()
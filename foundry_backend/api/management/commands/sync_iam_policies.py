@@ -0,0 +1,25 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from foundry_backend.api.startup import load_iam_policies
+
+
+class Command(BaseCommand):
+    help = 'Sync the IAM policies with the permissions file, writing only the policies that changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List what would change without writing anything')
+        parser.add_argument('--force', action='store_true',
+                            help='Overwrite policies that were changed through the API too')
+
+    def handle(self, *args, **options):
+        changes = load_iam_policies(logging.getLogger('AccessPolicyManager'), dry_run=options['dry_run'],
+                                    force=options['force'])
+
+        for change in changes:
+            self.stdout.write(change)
+
+        self.stdout.write('{} {} change{}'.format('Would make' if options['dry_run'] else 'Made', len(changes),
+                                                  '' if len(changes) == 1 else 's'))
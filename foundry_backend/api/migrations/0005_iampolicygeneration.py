@@ -0,0 +1,20 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_auto_20191027_0506'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IAMPolicyGeneration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_iampolicygeneration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NightlyJobChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=50)),
+                ('run', models.CharField(max_length=50)),
+                ('start', models.BigIntegerField()),
+                ('end', models.BigIntegerField()),
+                ('completed', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('job', 'run', 'start')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='iampolicygeneration',
+            name='source_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='iampolicygeneration',
+            name='source_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
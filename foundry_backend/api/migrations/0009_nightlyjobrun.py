@@ -0,0 +1,26 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_iampolicygeneration_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NightlyJobRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=50)),
+                ('run', models.CharField(max_length=50)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('job', 'run')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_nightlyjobrun'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='iampolicygeneration',
+            name='source_generation',
+        ),
+        migrations.AddField(
+            model_name='iampolicy',
+            name='source_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
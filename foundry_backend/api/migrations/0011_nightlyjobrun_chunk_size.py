@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_iampolicy_source_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nightlyjobrun',
+            name='chunk_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
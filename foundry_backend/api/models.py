@@ -1,7 +1,26 @@
+from typing import Iterable, List
+
 from django.db import models
 from multiselectfield import MultiSelectField
 
 
+def serialize_actions(actions: Iterable[str]) -> List[str]:
+    """
+    Translate IAM statement actions into the names drf-access-policy understands
+    """
+    final_actions = []
+
+    for action in actions:
+        if action == 'all':
+            final_actions.append('*')
+        elif action == 'safe':
+            final_actions.append('<safe_methods>')
+        else:
+            final_actions.append(action)
+
+    return final_actions
+
+
 class IAMPolicy(models.Model):
     """
     Defines a list of IAM policies
@@ -9,6 +28,9 @@ class IAMPolicy(models.Model):
     notes = models.CharField(max_length=255, null=True, blank=True)
     name = models.CharField(max_length=255, unique=True)
 
+    # the hash of the policy as last loaded from the permissions file, so that edits made since can be told apart
+    source_hash = models.CharField(max_length=64, blank=True)
+
     def serialize(self) -> dict:
         return {
             'name': self.name,
@@ -43,32 +65,14 @@ class IAMPolicyStatement(models.Model):
     effect = models.CharField(max_length=5, choices=IAM_EFFECT_OPTIONS)
 
     def serialize(self) -> dict:
-        final_actions = []
-
-        for action in self.actions:
-            if action == 'all':
-                final_actions.append('*')
-            elif action == 'safe':
-                final_actions.append('<safe_methods>')
-            else:
-                final_actions.append(action)
-
-        return_value = {
+        return {
             'notes': self.notes,
             'effect': self.effect,
-            'action': final_actions,
+            'action': serialize_actions(self.actions),
             'principal': [principal.serialize() for principal in self.principals.all()],
             'condition': [condition.serialize() for condition in self.conditions.all()]
         }
 
-        if len(self.principals.all()) > 0:
-            return_value['principal'] = [principal.serialize() for principal in self.principals.all()]
-
-        if len(self.conditions.all()) > 0:
-            return_value['condition'] = [condition.serialize() for condition in self.conditions.all()]
-
-        return return_value
-
 
 class IAMPolicyStatementPrincipal(models.Model):
     """
@@ -90,3 +94,51 @@ class IAMPolicyStatementCondition(models.Model):
 
     def serialize(self):
         return self.value
+
+
+class IAMPolicyGeneration(models.Model):
+    """
+    A counter bumped whenever the IAM policies change, so that every worker can tell when its cache is stale
+    """
+    generation = models.PositiveIntegerField(default=0)
+
+    # the hash of the permissions file last loaded
+    source_hash = models.CharField(max_length=64, blank=True)
+
+
+class NightlyJobRun(models.Model):
+    """
+    A run of a chunked nightly job, unfinished until every chunk of it has completed
+    """
+    job = models.CharField(max_length=50)
+    run = models.CharField(max_length=50)
+    started = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # the NIGHTLY_JOBS CHUNK_SIZE the run started with
+    chunk_size = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = (('job', 'run'),)
+
+
+class NightlyJobChunk(models.Model):
+    """
+    A completed chunk of a nightly job, so that a run which crashed can resume where it stopped
+    """
+    job = models.CharField(max_length=50)
+    run = models.CharField(max_length=50)
+    start = models.BigIntegerField()
+    end = models.BigIntegerField()
+    completed = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (('job', 'run', 'start'),)
+
+
+class Lease(models.Model):
+    """
+    A named lock, held by one process until it expires or is renewed
+    """
+    name = models.CharField(max_length=50, unique=True)
+    owner = models.CharField(max_length=255)
+    expires = models.DateTimeField()
@@ -0,0 +1,109 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min, QuerySet
+from django.utils import timezone
+
+from foundry_backend.api.models import NightlyJobChunk, NightlyJobRun
+
+
+def get_chunks(queryset: QuerySet, chunk_size: int) -> List[Tuple[int, int]]:
+    """
+    Split the primary keys of a queryset into half-open ranges
+
+    The ranges start at multiples of the chunk size, so that they stay the same when the lowest ids are deleted.
+
+    :param queryset: the rows a job works over
+    :param chunk_size: how many ids each range covers
+    :return: a list of (start, end) ranges
+    """
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+
+    if bounds['low'] is None:
+        return []
+
+    first = bounds['low'] - bounds['low'] % chunk_size
+
+    return [(start, start + chunk_size) for start in range(first, bounds['high'] + 1, chunk_size)]
+
+
+def _run_chunk(job: str, run: str, process_chunk: Callable[[int, int], int], start: int, end: int,
+               close_connection: bool) -> int:
+    try:
+        with transaction.atomic():
+            written = process_chunk(start, end)
+            NightlyJobChunk.objects.create(job=job, run=run, start=start, end=end)
+
+        return written
+    finally:
+        if close_connection:
+            connection.close()
+
+
+def run_chunked(job: str, run: str, queryset: QuerySet, process_chunk: Callable[[int, int], int],
+                logger: logging.Logger) -> int:
+    """
+    Run a nightly job over a queryset in chunks, configured by NIGHTLY_JOBS
+
+    Each chunk is processed and recorded in its own transaction. Chunks already recorded for this job and run are
+    skipped, so running a job again after a crash only does the work that is left, and a run that finished is not
+    done again. Runs that have not finished can be found with get_unfinished_runs(). When WORKERS is more than 1,
+    chunks run in a thread or process pool, as set by EXECUTOR.
+
+    :param job: the name of the job
+    :param run: identifies this run of the job, e.g. the date it covers
+    :param queryset: the rows to work over
+    :param process_chunk: called with each (start, end) id range; must be picklable to use a process pool
+    :param logger: the logger to report progress to
+    :return: the total of what process_chunk returned
+    """
+    config = settings.NIGHTLY_JOBS
+
+    job_run, _ = NightlyJobRun.objects.get_or_create(job=job, run=run, defaults={'chunk_size': config['CHUNK_SIZE']})
+    if job_run.finished is not None:
+        logger.info('Skipping \'{}\' ({}): it finished at {}'.format(job, run, job_run.finished))
+        return 0
+
+    # a resumed run keeps the chunk size it started with, so its chunks line up with those already recorded
+    chunk_size = job_run.chunk_size or config['CHUNK_SIZE']
+
+    completed = set(NightlyJobChunk.objects.filter(job=job, run=run).values_list('start', flat=True))
+    chunks = [chunk for chunk in get_chunks(queryset, chunk_size) if chunk[0] not in completed]
+
+    logger.info('Running \'{}\' ({}): {} chunks to do, {} already done'.format(job, run, len(chunks), len(completed)))
+
+    if config['WORKERS'] <= 1:
+        written = sum(_run_chunk(job, run, process_chunk, start, end, False) for start, end in chunks)
+    else:
+        if config['EXECUTOR'] == 'process':
+            # forked workers must not share this process's database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=config['WORKERS'])
+        else:
+            executor = ThreadPoolExecutor(max_workers=config['WORKERS'])
+
+        with executor:
+            futures = [executor.submit(_run_chunk, job, run, process_chunk, start, end, True) for start, end in chunks]
+            written = sum(future.result() for future in futures)
+
+    NightlyJobRun.objects.filter(pk=job_run.pk).update(finished=timezone.now())
+
+    # the progress of other runs is only needed until they finish
+    unfinished = NightlyJobRun.objects.filter(job=job, finished=None).values('run')
+    NightlyJobChunk.objects.filter(job=job).exclude(run=run).exclude(run__in=unfinished).delete()
+
+    return written
+
+
+def get_unfinished_runs(job: str) -> List[str]:
+    """
+    Find the runs of a job that started but never finished, e.g. because their process crashed
+
+    :param job: the name of the job
+    :return: the runs, oldest first
+    """
+    return list(NightlyJobRun.objects.filter(job=job, finished=None).order_by('started', 'id')
+                .values_list('run', flat=True))
@@ -1,37 +1,65 @@
 import datetime
+import functools
 import logging
+import time
+from typing import Optional
 
-import pytz
-from django.conf import settings
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
+from foundry_backend.api.nightly.chunked import run_chunked
 from foundry_backend.database import models
 
+MESSAGE_CHUNK_SIZE = 1000
 
-def gather_daily_views(logger: logging.Logger):
-    from foundry_backend.database import models
 
-    logger.info('Logging daily views...')
+def write_daily_view_messages(date: datetime.date, start: int, end: int) -> int:
+    """
+    Message realtors with the number of times each of their listings, with an id in [start, end), was viewed on a day
+
+    :return: the number of messages written
+    """
+    date_string = '{}/{}/{}'.format(date.month, date.day, date.year)
+
+    daily_hits = models.ListingHitDaily.objects.filter(listing=OuterRef('pk'), date=date)
+
+    listings = models.Listing.objects \
+        .filter(id__gte=start, id__lt=end, agent__user__isnull=False, property__isnull=False) \
+        .select_related('agent', 'property__address') \
+        .annotate(views=Coalesce(Subquery(daily_hits.values('count')[:1]), Value(0))) \
+        .order_by('agent_id', 'id')
 
-    local_timezone = pytz.timezone(settings.TIME_ZONE)
+    messages = []
 
-    today_min = local_timezone.localize(datetime.datetime.combine(datetime.date.today(), datetime.time.min))
-    today_max = local_timezone.localize(datetime.datetime.combine(datetime.date.today(), datetime.time.max))
+    for listing in listings:
+        message_string = 'On {}, the listing {} was viewed {} times'.format(
+            date_string,
+            '{} {}'.format(listing.property.address.street_number, listing.property.address.street),
+            listing.views
+        )
 
-    mls_numbers = models.MLSNumber.objects.all()
+        messages.append(models.UserMessage(type='HITS', message=message_string, user_id=listing.agent.user_id))
 
-    for number in mls_numbers:
-        listings = models.Listing.objects.filter(agent=number)
+    return len(models.UserMessage.objects.bulk_create(messages, batch_size=MESSAGE_CHUNK_SIZE))
+
+
+def gather_daily_views(logger: logging.Logger, date: Optional[datetime.date] = None) -> int:
+    """
+    Message every realtor with the number of times each of their listings was viewed on a day
+
+    :param logger: the logger to report to
+    :param date: the day, defaulting to today. It is also the run of the job, so a day is only messaged about once
+    :return: the number of messages written
+    """
+    logger.info('Logging daily views...')
 
-        for listing in listings:
-            hits = listing.hits.filter(access_time__range=(today_min, today_max)).count()
+    start = time.monotonic()
+    date = date or timezone.localdate()
 
-            message_string = 'On {}, the listing {} was viewed {} times'.format(
-                '{}/{}/{}'.format(today_min.month, today_min.day, today_min.year),
-                '{} {}'.format(listing.property.address.street_number, listing.property.address.street),
-                hits
-            )
+    written = run_chunked('gather_daily_views', date.isoformat(), models.Listing.objects.all(),
+                          functools.partial(write_daily_view_messages, date), logger)
 
-            message = models.UserMessage.objects.create(type='HITS', message=message_string, user_id=number.user.id)
-            message.save()
+    logger.info('Done! Wrote {} messages in {:.2f}s'.format(written, time.monotonic() - start))
 
-    logger.info('Done!')
+    return written
@@ -0,0 +1,19 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+from foundry_backend.database import models
+
+
+def prune_listing_hits(logger: logging.Logger):
+    """
+    Delete raw listing hits older than LISTINGS_HIT_RETENTION_DAYS. Their per-day totals in ListingHitDaily are kept
+    """
+    logger.info('Pruning listing hits...')
+
+    cutoff = timezone.now() - datetime.timedelta(days=settings.LISTINGS_HIT_RETENTION_DAYS)
+    deleted, _ = models.ListingsHit.objects.filter(access_time__lt=cutoff).delete()
+
+    logger.info('Done! Deleted {} listing hits from before {}'.format(deleted, cutoff))
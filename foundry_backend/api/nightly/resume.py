@@ -0,0 +1,47 @@
+import datetime
+import logging
+from typing import Callable, Dict, Optional
+
+from foundry_backend.api.nightly.chunked import get_unfinished_runs
+from foundry_backend.api.nightly.daily_messages import gather_daily_views
+
+
+def _gather_daily_views(run: str, logger: logging.Logger) -> int:
+    return gather_daily_views(logger, datetime.datetime.strptime(run, '%Y-%m-%d').date())
+
+
+# how to do a given run of each chunked job
+JOBS: Dict[str, Callable[[str, logging.Logger], int]] = {
+    'gather_daily_views': _gather_daily_views,
+}
+
+
+def run_job(job: str, run: str, logger: logging.Logger) -> int:
+    """
+    Do a run of a chunked job, or finish it if it stopped part way
+
+    :param job: the name of the job
+    :param run: the run, e.g. '2020-01-31' for gather_daily_views
+    :param logger: the logger to report to
+    :return: what the job returned
+    """
+    return JOBS[job](run, logger)
+
+
+def resume_unfinished_runs(logger: logging.Logger, job: Optional[str] = None) -> int:
+    """
+    Finish every run of the chunked jobs that stopped part way, e.g. because the scheduler's process crashed
+
+    :param logger: the logger to report to
+    :param job: only resume the runs of this job
+    :return: how many runs were resumed
+    """
+    resumed = 0
+
+    for name in ([job] if job else sorted(JOBS)):
+        for run in get_unfinished_runs(name):
+            logger.info('Resuming \'{}\' ({})'.format(name, run))
+            run_job(name, run, logger)
+            resumed += 1
+
+    return resumed
@@ -0,0 +1,161 @@
+import base64
+import json
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset pagination, used when a request has a `cursor` or `page_size` parameter
+
+    Pages are ordered by the view's `keyset_ordering`, which must end with a unique field. Each page ends with a cursor
+    holding the last row's ordering values, and the next page is filtered to the rows after it, so page 1000 costs no
+    more than page one. No COUNT is run unless `count=approximate` is asked for.
+
+    Query parameters listed in the view's `keyset_unpaged_params` order results some other way, e.g. a text search by
+    rank, which a cursor over `keyset_ordering` would lose. Asking for pages together with one of them is a 400.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+
+    page_size = 20
+    max_page_size = 100
+
+    # past this many rows, approximate counts stop counting
+    approximate_count_limit = 1000
+
+    def __init__(self):
+        self.request = None
+        self.next_cursor: Optional[str] = None
+        self.count: Optional[int] = None
+        self.count_is_estimate = False
+
+    def is_requested(self, request) -> bool:
+        return self.cursor_query_param in request.query_params or self.page_size_query_param in request.query_params
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+
+        return max(1, min(page_size, self.max_page_size))
+
+    def check_unpaged_params(self, request, view):
+        for param in getattr(view, 'keyset_unpaged_params', ()):
+            if request.query_params.get(param, '').strip():
+                raise ValidationError({param: ['Results ordered by \'{}\' cannot be paged with \'{}\' or \'{}\'.'
+                                               .format(param, self.cursor_query_param, self.page_size_query_param)]})
+
+    @staticmethod
+    def get_ordering(view) -> Tuple[str, ...]:
+        return tuple(getattr(view, 'keyset_ordering', ('id',)))
+
+    @staticmethod
+    def encode_cursor(values: List) -> str:
+        # str() keeps the microseconds that DjangoJSONEncoder would drop from datetimes, and to_python reads it back
+        return base64.urlsafe_b64encode(json.dumps(values, default=str).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(queryset: QuerySet, ordering: Tuple[str, ...], cursor: str) -> List:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in ordering]
+
+            if len(values) != len(fields):
+                raise ValueError()
+
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except Exception:
+            raise NotFound('Invalid cursor')
+
+    @staticmethod
+    def filter_after(queryset: QuerySet, ordering: Tuple[str, ...], values: List) -> QuerySet:
+        """
+        Filter to the rows that come after `values` in `ordering`, e.g. for (-date_posted, -id):
+        date_posted < d OR (date_posted = d AND id < i)
+        """
+        after = Q()
+
+        for index, name in enumerate(ordering):
+            field = name.lstrip('-')
+            lookup = '{}__{}'.format(field, 'lt' if name.startswith('-') else 'gt')
+
+            equal = {other.lstrip('-'): value for other, value in zip(ordering[:index], values[:index])}
+            after |= Q(**equal, **{lookup: values[index]})
+
+        return queryset.filter(after)
+
+    def get_approximate_count(self, queryset: QuerySet) -> Tuple[int, bool]:
+        connection = connections[queryset.db]
+
+        if connection.vendor == 'postgresql':
+            # the planner's row estimate is free and good enough for a scroll bar
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+                plan = cursor.fetchone()[0]
+
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            return plan[0]['Plan']['Plan Rows'], True
+
+        count = queryset.order_by()[:self.approximate_count_limit + 1].count()
+
+        return min(count, self.approximate_count_limit), count > self.approximate_count_limit
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request) or not isinstance(queryset, QuerySet):
+            return None
+
+        self.check_unpaged_params(request, view)
+
+        self.request = request
+        ordering = self.get_ordering(view)
+        page_size = self.get_page_size(request)
+
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.count, self.count_is_estimate = self.get_approximate_count(queryset)
+
+        queryset = queryset.order_by(*ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self.filter_after(queryset, ordering, self.decode_cursor(queryset, ordering, cursor))
+
+        page = list(queryset[:page_size + 1])
+
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            self.next_cursor = self.encode_cursor([getattr(last, name.lstrip('-')) for name in ordering])
+
+        return page
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_cursor is None:
+            return None
+
+        url = remove_query_param(self.request.build_absolute_uri(), self.count_query_param)
+
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        body = OrderedDict([('next', self.get_next_link())])
+
+        if self.count is not None:
+            body['count'] = self.count
+            body['count_is_estimate'] = self.count_is_estimate
+
+        body['results'] = data
+
+        return Response(body)
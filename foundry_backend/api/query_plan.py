@@ -0,0 +1,124 @@
+from typing import List, Optional
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, Prefetch, QuerySet
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField
+
+
+class QueryPlan:
+    """
+    The select_related, prefetch_related and only() calls that load everything a serializer reads
+
+    `only` is None when the serializer reads something other than model fields, e.g. a property or a method field, in
+    which case every field is loaded.
+    """
+    def __init__(self):
+        self.select_related: List[str] = []
+        self.prefetch_related: List[Prefetch] = []
+        self.only: Optional[List[str]] = []
+
+    def apply(self, queryset: QuerySet) -> QuerySet:
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only is not None:
+            # anything already being followed must stay loaded
+            queryset = queryset.only(*dict.fromkeys(self.only + _forward_relations(queryset)))
+
+        return queryset
+
+
+def _forward_relations(queryset: QuerySet) -> List[str]:
+    if not isinstance(queryset.query.select_related, dict):
+        return []
+
+    return [name for name in queryset.query.select_related if _is_forward_relation(queryset.model, name)]
+
+
+def _is_forward_relation(model, name: str) -> bool:
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+
+    return field.concrete and field.is_relation
+
+
+def _prefixed(prefix: str, name: str) -> str:
+    return '{}__{}'.format(prefix, name) if prefix else name
+
+
+def _plan_into(plan: QueryPlan, serializer: serializers.BaseSerializer, model, prefix: str):
+    only = [_prefixed(prefix, model._meta.pk.name)]
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        source = field.source
+
+        try:
+            model_field = model._meta.get_field(source) if source != '*' and '.' not in source else None
+        except FieldDoesNotExist:
+            model_field = None
+
+        if model_field is None:
+            # a property, method or dotted source can read anything on the object
+            only = None
+            continue
+
+        path = _prefixed(prefix, source)
+
+        if isinstance(field, (serializers.ListSerializer, ManyRelatedField)):
+            plan.prefetch_related.append(_plan_prefetch(field, model_field, path))
+        elif isinstance(field, serializers.BaseSerializer):
+            plan.select_related.append(path)
+
+            if model_field.concrete and only is not None:
+                only.append(path)
+
+            _plan_into(plan, field, model_field.related_model, path)
+        elif only is not None:
+            only.append(path)
+
+    if plan.only is not None:
+        plan.only = plan.only + only if only is not None else None
+
+
+def _plan_prefetch(field, model_field, path: str) -> Prefetch:
+    related_model = model_field.related_model
+
+    if isinstance(field, ManyRelatedField):
+        return Prefetch(path, queryset=related_model.objects.only(related_model._meta.pk.name))
+
+    child_plan = plan_serializer(field.child, related_model)
+
+    if child_plan.only is not None and model_field.one_to_many:
+        # the related rows are matched back to their parents through this foreign key
+        child_plan.only.append(model_field.field.name)
+    elif not model_field.one_to_many:
+        child_plan.only = None
+
+    return Prefetch(path, queryset=child_plan.apply(related_model.objects.all()))
+
+
+def plan_serializer(serializer: serializers.BaseSerializer, model: Optional[Model] = None) -> QueryPlan:
+    """
+    Work out how to load everything a serializer reads, in a number of queries that does not grow with the results
+
+    Nested serializers for forward and one-to-one relations become select_related joins, and nested lists become
+    prefetches planned the same way.
+
+    :param serializer: the serializer, or a list serializer, that will read the results
+    :param model: the model being serialized, if not the serializer's Meta.model
+    :return: the plan
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+
+    plan = QueryPlan()
+    _plan_into(plan, serializer, model or serializer.Meta.model, '')
+
+    return plan
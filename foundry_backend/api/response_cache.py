@@ -0,0 +1,136 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+from foundry_backend.database import models
+
+# the cached responses each model appears in
+INVALIDATED_GROUPS = {
+    models.Listing: ('listings',),
+    models.Property: ('listings',),
+    models.Room: ('listings',),
+    models.NearbyAttraction: ('listings',),
+    models.ListingImage: ('listings',),
+    models.Address: ('listings', 'agencies'),
+    models.Agency: ('agencies',),
+    models.MLSNumber: ('agencies',),
+    # agencies list their realtors' names and emails
+    User: ('agencies',),
+}
+
+# fields that are saved on their own without appearing in any cached response, e.g. on every login
+UNCACHED_FIELDS = {
+    User: {'last_login', 'password'},
+}
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE['ALIAS']]
+
+
+def _version_key(group: str) -> str:
+    return 'responses:{}:version'.format(group)
+
+
+def get_version(group: str) -> int:
+    """
+    Get the version of a group's cached responses. Bumping it orphans every response cached before
+    """
+    return get_cache().get_or_set(_version_key(group), 1, None)
+
+
+def invalidate(group: str):
+    """
+    Drop every cached response in a group
+    """
+    try:
+        get_cache().incr(_version_key(group))
+    except ValueError:
+        get_cache().set(_version_key(group), 1, None)
+
+
+def get_key(group: str, request) -> str:
+    """
+    Build the cache key for a request, ignoring the order of its query parameters
+
+    The scheme and host are part of the key, since responses hold absolute links (e.g. the next page's)
+
+    :param group: the group the response belongs to
+    :param request: the request being answered
+    :return: the key, versioned by group
+    """
+    query = urlencode(sorted((key, value) for key, values in request.query_params.lists() for value in values))
+    url = request.build_absolute_uri(request.path)
+    digest = hashlib.sha1('{}?{}'.format(url, query).encode('utf-8')).hexdigest()
+
+    return 'responses:{}:{}:{}'.format(group, get_version(group), digest)
+
+
+class ResponseCacheMixin:
+    """
+    Caches the data of list and retrieve responses that the access policy makes public
+
+    A response is only cached when anonymous users may make the same request unconditionally, so it can never hold
+    anything private. Cached responses are dropped whenever a model in `response_cache_group` changes (see
+    INVALIDATED_GROUPS), and expire after RESPONSE_CACHE['TIMEOUT'] seconds regardless.
+    """
+    response_cache_group = None
+
+    def is_public(self, request) -> bool:
+        compiled = self.access_policy().get_compiled_policy(request, self)
+
+        return compiled.is_public(self.action, request.method in ('GET', 'HEAD'))
+
+    def get_cached_response(self, request, respond) -> Response:
+        if not settings.RESPONSE_CACHE['ENABLED'] or not self.is_public(request):
+            return respond()
+
+        key = get_key(self.response_cache_group, request)
+        data = get_cache().get(key)
+
+        if data is not None:
+            return Response(data)
+
+        response = respond()
+
+        if response.status_code == 200:
+            get_cache().set(key, response.data, settings.RESPONSE_CACHE['TIMEOUT'])
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, lambda: super(ResponseCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(request,
+                                        lambda: super(ResponseCacheMixin, self).retrieve(request, *args, **kwargs))
+
+
+def invalidate_model(model):
+    """
+    Drop every cached response a model appears in, as saving or deleting one of its rows does
+    """
+    for group in INVALIDATED_GROUPS[model]:
+        invalidate(group)
+
+        # a response cached while the change was uncommitted would still be stale
+        transaction.on_commit(lambda group=group: invalidate(group))
+
+
+def _invalidate_responses(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= UNCACHED_FIELDS.get(sender, set()):
+        return
+
+    invalidate_model(sender)
+
+
+# connected per model, so that saving any other model does not pay for the lookup
+for _model in INVALIDATED_GROUPS:
+    post_save.connect(_invalidate_responses, sender=_model, dispatch_uid='invalidate_responses')
+    post_delete.connect(_invalidate_responses, sender=_model, dispatch_uid='invalidate_responses')
@@ -1,3 +1,5 @@
+import datetime
+
 from django.contrib.auth.models import User
 from djoser.serializers import UserCreateSerializer
 from drf_writable_nested import WritableNestedModelSerializer
@@ -215,6 +217,74 @@ class EnableAdminSerializer(serializers.Serializer):
     user = serializers.IntegerField(help_text="The user to associate as an admin")
 
 
+class ListingClustersQuerySerializer(serializers.Serializer):
+    zoom = serializers.IntegerField(min_value=0, max_value=22, help_text="The map's zoom level")
+
+
+class ListingClusterSerializer(serializers.Serializer):
+    geohash = serializers.CharField(help_text="The geohash cell the listings are in")
+    count = serializers.IntegerField(help_text="How many listings are in the cell")
+    latitude = serializers.FloatField(help_text="The average latitude of the listings")
+    longitude = serializers.FloatField(help_text="The average longitude of the listings")
+    min_price = serializers.IntegerField(help_text="The lowest asking price in the cell")
+    max_price = serializers.IntegerField(help_text="The highest asking price in the cell")
+    listing = serializers.IntegerField(allow_null=True, help_text="The listing, when it is the only one in the cell")
+
+
+class ShowingAvailabilityQuerySerializer(serializers.Serializer):
+    to = serializers.DateTimeField(help_text="The end of the time to search")
+    duration = serializers.IntegerField(min_value=1, max_value=24 * 60, default=30,
+                                        help_text="How long the showing needs to be, in minutes")
+
+    # how far apart 'from' and 'to' may be
+    max_days = 31
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # 'from' is a keyword, so it cannot be declared like the other fields
+        fields['from'] = serializers.DateTimeField(help_text="The start of the time to search")
+        return fields
+
+    def validate(self, attrs):
+        if attrs['to'] <= attrs['from']:
+            raise ValidationError({'to': "\'to\' must be after \'from\'."})
+
+        if (attrs['to'] - attrs['from']).days >= self.max_days:
+            raise ValidationError({'to': 'Searches cannot span more than {} days.'.format(self.max_days)})
+
+        attrs['duration'] = datetime.timedelta(minutes=attrs['duration'])
+
+        return attrs
+
+
+class ListingsAvailabilityQuerySerializer(ShowingAvailabilityQuerySerializer):
+    listings = serializers.CharField(help_text="The listings to search, separated by commas")
+
+    # how many listings one request may search
+    max_listings = 100
+
+    def validate_listings(self, value):
+        try:
+            listings = sorted({int(listing) for listing in value.split(',')})
+        except ValueError:
+            raise ValidationError('Enter listing ids separated by commas.')
+
+        if len(listings) > self.max_listings:
+            raise ValidationError('Searches cannot have more than {} listings.'.format(self.max_listings))
+
+        return listings
+
+
+class ShowingSlotSerializer(serializers.Serializer):
+    start = serializers.DateTimeField(help_text="When the slot starts")
+    end = serializers.DateTimeField(help_text="When the slot ends, and the next showing starts")
+
+
+class ListingAvailabilitySerializer(serializers.Serializer):
+    listing = serializers.IntegerField(help_text="The listing")
+    slots = ShowingSlotSerializer(many=True, help_text="The listing's free slots, in order")
+
+
 class FullIAMPolicyStatementPrincipalSerializer(serializers.ModelSerializer):
     """
     Serialize an IAMPolicyRulePrincipal item
@@ -1,20 +1,31 @@
+import atexit
+import hashlib
 import json
 import logging
 import os
+import threading
+from typing import Callable, List, Optional
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from django.conf import settings
 from django.contrib.auth.models import User, Group
+from django.db import DatabaseError, close_old_connections, connection, transaction
 from django_apscheduler.jobstores import register_events
 
+from foundry_backend.api import leases
+from foundry_backend.api.access import policy_cache
+from foundry_backend.api.access.policy_sync import sync_policies
 from foundry_backend.api.nightly.daily_messages import gather_daily_views
-from foundry_backend.api.models import IAMPolicy
-from foundry_backend.api.serializers import IAMPolicySerializer
+from foundry_backend.api.nightly.listing_hits import prune_listing_hits
+from foundry_backend.api.nightly.resume import resume_unfinished_runs
+from foundry_backend.api.models import IAMPolicyGeneration
 
-scheduler = BackgroundScheduler(settings.SCHEDULER_CONFIG)
+def create_scheduler(logger: logging.Logger) -> BackgroundScheduler:
+    """
+    Build a scheduler with every nightly task registered, ready to start
+    """
+    scheduler = BackgroundScheduler(settings.SCHEDULER_CONFIG)
 
-
-def start_nightly_tasks(logger: logging.Logger):
     logger.info('Registering tasks...')
 
     logger.info('Registering task: \'gather_daily_views\'')
@@ -30,60 +41,176 @@ def start_nightly_tasks(logger: logging.Logger):
     )
     logger.info('Done registering tasks: \'gather_daily_views\'')
 
+    logger.info('Registering task: \'prune_listing_hits\'')
+    scheduler.add_job(
+        prune_listing_hits,
+        'cron',
+        id='prune_listing_hits',
+        hour=settings.DAILY_MESSAGE_TIME['HOUR'],
+        minute=settings.DAILY_MESSAGE_TIME['MINUTE'],
+        second=settings.DAILY_MESSAGE_TIME['SECOND'],
+        replace_existing=True,
+        kwargs={'logger': logger}
+    )
+    logger.info('Done registering tasks: \'prune_listing_hits\'')
+
+    # a run cut short when the last scheduler stopped would otherwise never finish, as the cron trigger has moved on
+    logger.info('Registering task: \'resume_unfinished_runs\'')
+    scheduler.add_job(
+        resume_unfinished_runs,
+        id='resume_unfinished_runs',
+        replace_existing=True,
+        kwargs={'logger': logger}
+    )
+    logger.info('Done registering tasks: \'resume_unfinished_runs\'')
+
     register_events(scheduler)
 
-    scheduler.start()
+    return scheduler
+
+
+class SchedulerLeader:
+    """
+    Runs the scheduler only while this process holds the scheduler lease
+
+    Every process that wants to run the nightly tasks competes for the same lease in the database. The holder renews
+    it every third of SCHEDULER_LEASE_SECONDS; if it dies, another process takes over once the lease expires.
+    """
+    LEASE_NAME = 'scheduler'
+
+    def __init__(self, logger: logging.Logger,
+                 scheduler_factory: Optional[Callable[[logging.Logger], BackgroundScheduler]] = None):
+        self.logger = logger
+        self.scheduler_factory = scheduler_factory or create_scheduler
+        self.lease_seconds = settings.SCHEDULER_LEASE_SECONDS
+        self.owner = leases.get_owner()
+        self.scheduler: Optional[BackgroundScheduler] = None
+
+        self._stopped = threading.Event()
+
+    @property
+    def is_leader(self) -> bool:
+        return self.scheduler is not None
+
+    def step(self) -> bool:
+        """
+        Take or renew the lease, then start or stop the scheduler to match
+
+        :return: True if this process is running the scheduler
+        """
+        try:
+            holds_lease = leases.acquire_lease(self.LEASE_NAME, self.owner, self.lease_seconds)
+        except DatabaseError:
+            self.logger.exception('Could not reach the database to renew the scheduler lease')
+            holds_lease = False
+
+        if holds_lease and not self.is_leader:
+            self.logger.info('\'{}\' took the scheduler lease, starting the scheduler'.format(self.owner))
+            self.scheduler = self.scheduler_factory(self.logger)
+            self.scheduler.start()
+        elif not holds_lease and self.is_leader:
+            self.logger.warning('\'{}\' lost the scheduler lease, stopping the scheduler'.format(self.owner))
+            self._shutdown_scheduler()
+
+        return self.is_leader
+
+    def run(self):
+        """
+        Compete for the lease until stop() is called
+        """
+        while not self._stopped.is_set():
+            close_old_connections()
+            self.step()
+            self._stopped.wait(self.lease_seconds / 3)
+
+    def start(self):
+        """
+        Compete for the lease from a background thread
+        """
+        threading.Thread(target=self.run, name='SchedulerLeader', daemon=True).start()
+        atexit.register(self.stop)
 
+    def stop(self):
+        """
+        Stop competing, stop the scheduler and hand the lease on
+        """
+        self._stopped.set()
 
-def load_iam_policies(logger: logging.Logger):
-    def _load_json_access_policies(path: str):
-        logger.info('Deleting default authentication model...')
+        if self.is_leader:
+            self._shutdown_scheduler()
+            leases.release_lease(self.LEASE_NAME, self.owner)
 
-        IAMPolicy.objects.filter(name='default').delete()
+    def _shutdown_scheduler(self):
+        scheduler, self.scheduler = self.scheduler, None
+        scheduler.shutdown(wait=False)
 
-        logger.info('Creating authentication models')
 
-        with open(path, 'r') as permissions_file:
-            permissions_data = json.loads(str(permissions_file.read()))
-            for perm in permissions_data:
-                serializer = IAMPolicySerializer(data=perm)
+def start_nightly_tasks(logger: logging.Logger):
+    """
+    Start the nightly tasks in this process, as configured by SCHEDULER_AUTOSTART and SCHEDULER_LEADER_ELECTION
+    """
+    if not settings.SCHEDULER_AUTOSTART:
+        logger.info('SCHEDULER_AUTOSTART is off; run \'manage.py run_scheduler\' to run the nightly tasks')
+        return
+
+    if settings.SCHEDULER_LEADER_ELECTION:
+        logger.info('Competing for the scheduler lease...')
+        SchedulerLeader(logger).start()
+    else:
+        create_scheduler(logger).start()
+
+
+def get_permissions_path() -> str:
+    return os.path.join(settings.BASE_DIR, settings.PERMISSIONS_JSON)
+
+
+def get_permissions_hash(path: str) -> str:
+    """
+    Hash the contents of a permissions file
 
-                if serializer.is_valid():
-                    logger.info('Saving Policy: \'{}\''.format(perm['name']))
-                    serializer.save()
+    :param path: the path to the permissions file
+    :return: the file's SHA-256, in hex
+    """
+    with open(path, 'rb') as permissions_file:
+        return hashlib.sha256(permissions_file.read()).hexdigest()
 
-    def _load_default_access_policies():
-        _load_json_access_policies(os.path.join(settings.BASE_DIR, settings.PERMISSIONS_JSON))
 
-    def _load_wild_west_access_policies():
-        IAMPolicy.objects.all().delete()
+def create_default_admin(logger: logging.Logger):
+    if not User.objects.filter(username=settings.ADMIN_USERNAME).exists():
+        logger.info('Could not find admin user \'{}\' user. Creating now...'.format(settings.ADMIN_USERNAME))
+        admin = User.objects.create_user(username=settings.ADMIN_USERNAME,
+                                         password=settings.ADMIN_PASSWORD,
+                                         email=settings.ADMIN_EMAIL)
 
-        _load_json_access_policies(os.path.join(settings.BASE_DIR, settings.PERMISSIONS_JSON))
+        admin.is_staff = True
+        admin.is_superuser = True
 
-    def _create_default_admin():
-        if not User.objects.filter(username=settings.ADMIN_USERNAME).exists():
-            logger.info('Could not find admin user \'{}\' user. Creating now...'.format(settings.ADMIN_USERNAME))
-            admin = User.objects.create_user(username=settings.ADMIN_USERNAME,
-                                             password=settings.ADMIN_PASSWORD,
-                                             email=settings.ADMIN_EMAIL)
+        admin_group = Group.objects.get_or_create(name='admin')[0]
+        admin_group.save()
 
-            admin.is_staff = True
-            admin.is_superuser = True
+        admin_group.user_set.add(admin)
+        admin_group.save()
 
-            admin_group = Group.objects.get_or_create(name='admin')[0]
-            admin_group.save()
+        logger.warning('\'{}\' password is \'{}\''.format(settings.ADMIN_USERNAME, settings.ADMIN_PASSWORD))
+        logger.warning('⚠️⚠️⚠️ THIS SHOULD BE CHANGED IMMEDIATELY ⚠️⚠️⚠️')
+    else:
+        logger.info('Found \'admin\' user.')
 
-            admin_group.user_set.add(admin)
-            admin_group.save()
 
-            logger.warning('\'{}\' password is \'{}\''.format(settings.ADMIN_USERNAME, settings.ADMIN_PASSWORD))
-            logger.warning('⚠️⚠️⚠️ THIS SHOULD BE CHANGED IMMEDIATELY ⚠️⚠️⚠️')
-        else:
-            logger.info('Found \'admin\' user.')
+def load_iam_policies(logger: logging.Logger, dry_run: bool = False, force: bool = False) -> List[str]:
+    """
+    Sync the IAM policies with the permissions file, then make sure the admin user exists
 
+    :param logger: the logger to report to
+    :param dry_run: only report what would change
+    :param force: overwrite policies changed through the API too
+    :return: a description of each change to the policies
+    """
     logger.info('Loading authentication policies...')
 
-    if settings.ENV_NAME == 'wild_west':
+    prune = settings.ENV_NAME == 'wild_west'
+
+    if prune:
         logger.warning(
             '⚠️🌵️🐎 WILD WEST MODE 🐎🌵️⚠️️'
             'WILD WEST MODE WILL PURGE ALL'
@@ -93,11 +220,65 @@ def load_iam_policies(logger: logging.Logger):
             'RUN. DO NOT RUN IN PRODUCTION'
             '⚠️🌵️🐎 WILD WEST MODE 🐎🌵️⚠️️'
         )
-        _load_wild_west_access_policies()
 
-    else:
-        _load_default_access_policies()
+    path = get_permissions_path()
+
+    with open(path, 'r') as permissions_file:
+        permissions_data = json.loads(str(permissions_file.read()))
+
+    changes = sync_policies(permissions_data, logger, prune=prune, dry_run=dry_run, force=force or prune)
+
+    if dry_run:
+        return changes
+
+    # remember what was loaded, so bootstrap() can skip reloading the same file
+    state, _ = IAMPolicyGeneration.objects.get_or_create(pk=policy_cache.GENERATION_ID)
+    IAMPolicyGeneration.objects.filter(pk=state.pk).update(source_hash=get_permissions_hash(path))
+
+    create_default_admin(logger)
+
+    logger.info('Done loading authentication policies: {} changes.'.format(len(changes)))
+
+    return changes
+
+
+def bootstrap(logger: logging.Logger) -> bool:
+    """
+    Bring the IAM policies and admin user up to date. Safe to run any number of times, from any number of processes
+
+    The policies are only reloaded if the permissions file has changed since it was last loaded. Policies changed
+    through the API are left as they are, see sync_policies.
+
+    :return: True if the policies were reloaded
+    """
+    digest = get_permissions_hash(get_permissions_path())
+
+    with transaction.atomic():
+        # lock the generation, so that processes starting together load the policies once between them
+        state, _ = IAMPolicyGeneration.objects.select_for_update().get_or_create(pk=policy_cache.GENERATION_ID)
+
+        if state.source_hash == digest:
+            logger.info('Authentication policies are up to date.')
+            create_default_admin(logger)
+            return False
+
+        load_iam_policies(logger)
+
+    return True
+
+
+def start_worker():
+    """
+    Run from each gunicorn worker as it starts, by the post_worker_init hook in gunicorn_config: bootstrap if
+    BOOTSTRAP_ON_STARTUP is on, then start the nightly tasks
+    """
+    if not settings.BOOTSTRAP_ON_STARTUP and not settings.SCHEDULER_AUTOSTART:
+        return
+
+    tables = connection.introspection.table_names()
 
-    _create_default_admin()
+    if settings.BOOTSTRAP_ON_STARTUP and 'api_iampolicy' in tables:
+        bootstrap(logging.getLogger('AccessPolicyManager'))
 
-    logger.info('Done loading authentication policies.')
+    if 'django_apscheduler_djangojob' in tables:
+        start_nightly_tasks(logging.getLogger('ScheduleBatchTasks'))
@@ -1,20 +1,46 @@
 import datetime
+import logging
+import os
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
 from typing import List, Tuple
 from unittest.mock import MagicMock, patch, call
+from urllib.parse import parse_qs, urlparse
 from uuid import UUID
 
 import pytest
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, AnonymousUser
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from requests import Response
-from rest_framework import status
+from rest_framework import serializers as rest_serializers, status
 from rest_framework.authtoken.models import Token
-from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework.utils import json
-from foundry_backend.api import views, serializers
-from foundry_backend.api.models import IAMPolicy
+from foundry_backend.api import geo, views, serializers
+from foundry_backend.api.compiled_serializer import CompiledSerializer
+from foundry_backend.api.leases import acquire_lease, release_lease
+from foundry_backend.api.query_plan import plan_serializer
+from foundry_backend.api.text_search import search_listings
+from foundry_backend.api.nightly.chunked import get_chunks, get_unfinished_runs
+from foundry_backend.api.nightly.daily_messages import gather_daily_views, write_daily_view_messages
+from foundry_backend.api.nightly.listing_hits import prune_listing_hits
+from foundry_backend.api.access import policy_cache
+from foundry_backend.api.access.compiled_policy import CompiledPolicy
+from foundry_backend.api.access.policy_sync import sync_policies
+from foundry_backend.api.access.ownership import get_owning_agency_id, get_realtor_ids, is_member_of_agency
+from foundry_backend.api.models import IAMPolicy, IAMPolicyStatement, IAMPolicyStatementPrincipal, \
+    IAMPolicyStatementCondition, Lease, NightlyJobChunk
+from foundry_backend.api.startup import SchedulerLeader, bootstrap, load_iam_policies
 from foundry_backend.database.apps import DatabaseConfig
 from foundry_backend.database.models import Agency, MLSNumber, Listing, Address, UserMessage, NearbyAttraction, \
-    listing_path_generator, avatar_path_generator
+    Property, Showing, Room, ListingImage, ListingSearch, ZipCentroid, listing_path_generator, avatar_path_generator
 
 
 def check_list_equal(first: List, second: List):
@@ -535,6 +561,331 @@ def test_realtor_can_create_nearby_attractions(realtor_a, listing_a, setup):
     assert json.loads(response.render().content) == {**data}
 
 
+def test_listing_object_is_loaded_once_per_request(listing_a, django_assert_num_queries):
+    view = views.ListingViewSet(action='retrieve', detail=True, kwargs={'pk': listing_a.id}, format_kwarg=None,
+                                request=Request(APIRequestFactory().get('/')))
+
+    # the listing and its agency in one query, plus the prefetched rooms and nearby attractions
+    with django_assert_num_queries(3):
+        listing = view.get_object()
+
+        assert view.get_object() is listing
+        assert listing.agent.agency.name == 'Alpha Agency'
+
+
+def test_listing_list_does_not_follow_object_relations(listing_a):
+    view = views.ListingViewSet(action='list', detail=False, kwargs={}, format_kwarg=None,
+                                request=Request(APIRequestFactory().get('/')))
+
+    assert 'agent' not in view.get_queryset().query.select_related
+
+
+def test_owning_agency_is_resolved_in_one_query(listing_a, showing_a_1, realtor_a, django_assert_num_queries):
+    _, agency, _, _ = realtor_a
+    prop = Property.objects.get(pk=listing_a.property.pk)
+    showing = Showing.objects.get(pk=showing_a_1.pk)
+
+    with django_assert_num_queries(2):
+        assert get_owning_agency_id(prop) == agency.id
+        assert get_owning_agency_id(showing) == agency.id
+
+
+def test_owning_agency_uses_loaded_relations(listing_a, realtor_a, django_assert_num_queries):
+    _, agency, _, _ = realtor_a
+    listing = Listing.objects.select_related('agent').get(pk=listing_a.pk)
+
+    with django_assert_num_queries(0):
+        assert get_owning_agency_id(listing) == agency.id
+
+
+def test_realtor_agency_is_cached_on_request(realtor_a, realtor_b, django_assert_num_queries):
+    realtor, agency, mls, _ = realtor_a
+    request = SimpleNamespace(user=realtor)
+
+    with django_assert_num_queries(1):
+        assert get_realtor_ids(request) == (mls.id, agency.id)
+        assert is_member_of_agency(request, agency.id)
+        assert not is_member_of_agency(request, realtor_b[1].id)
+
+
+def test_anonymous_user_is_not_in_any_agency(realtor_a, django_assert_num_queries):
+    request = SimpleNamespace(user=AnonymousUser())
+
+    with django_assert_num_queries(0):
+        assert not is_member_of_agency(request, realtor_a[1].id)
+        assert not is_member_of_agency(request, None)
+
+
+def test_anyone_can_record_listing_hit(client, listing_a, listings_hit_policy, setup):
+    response = client.post('/api/v1/listings_hits/', {'listing': listing_a.id})
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert listing_a.hits.count() == 1
+    assert listing_a.daily_hits.get(date=timezone.localdate()).count == 1
+
+
+def test_buffered_listing_hits_are_accepted_then_written(client, listing_a, listings_hit_policy, hit_buffer, setup):
+    before = timezone.now()
+
+    response = client.post('/api/v1/listings_hits/', {'listing': listing_a.id})
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert listing_a.hits.count() == 0
+    assert len(hit_buffer) == 1
+
+    assert hit_buffer.flush() == 1
+    assert listing_a.hits.count() == 1
+    assert listing_a.hits.get().access_time >= before
+    assert len(hit_buffer) == 0
+
+
+def test_buffered_listing_hits_are_validated(client, listings_hit_policy, hit_buffer, setup):
+    response = client.post('/api/v1/listings_hits/', {'listing': 12345})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert len(hit_buffer) == 0
+
+
+def test_hit_buffer_wakes_flusher_when_full(listing_a, hit_buffer):
+    for _ in range(2):
+        hit_buffer.add(listing_a.id)
+
+    assert not hit_buffer._wake.is_set()
+
+    hit_buffer.add(listing_a.id)
+
+    assert hit_buffer._wake.is_set()
+
+
+def test_hit_buffer_drops_hits_for_deleted_listings(listing_a, listing_b, hit_buffer):
+    hit_buffer.add(listing_a.id)
+    hit_buffer.add(listing_b.id)
+    listing_b.delete()
+
+    assert hit_buffer.flush() == 1
+    assert listing_a.hits.count() == 1
+
+
+def test_hit_buffer_keeps_hits_that_fail_to_write(listing_a, listing_b, hit_buffer):
+    hit_buffer.max_size = 4
+
+    hit_buffer.add(listing_a.id)
+    hit_buffer.add(listing_a.id)
+
+    failing_write = patch('foundry_backend.api.hits.record_daily_hits', side_effect=DatabaseError('database is locked'))
+
+    with failing_write, pytest.raises(DatabaseError):
+        hit_buffer.flush()
+
+    assert len(hit_buffer) == 2
+    assert listing_a.hits.count() == 0
+
+    for _ in range(3):
+        hit_buffer.add(listing_b.id)
+
+    # past max_size, the oldest hits are dropped first
+    with failing_write, pytest.raises(DatabaseError):
+        hit_buffer.flush()
+
+    assert len(hit_buffer) == 4
+    assert hit_buffer.flush() == 4
+    assert listing_a.hits.count() == 1
+    assert listing_b.hits.count() == 3
+
+
+def test_buffered_listing_hits_add_to_daily_totals(listing_a, listing_b, hit_buffer):
+    yesterday = timezone.now() - datetime.timedelta(days=1)
+
+    hit_buffer.add(listing_a.id)
+    hit_buffer.add(listing_a.id)
+    hit_buffer.add(listing_a.id, yesterday)
+    hit_buffer.add(listing_b.id)
+    hit_buffer.flush()
+
+    hit_buffer.add(listing_a.id)
+    hit_buffer.flush()
+
+    assert listing_a.daily_hits.get(date=timezone.localdate()).count == 3
+    assert listing_a.daily_hits.get(date=timezone.localdate(yesterday)).count == 1
+    assert listing_b.daily_hits.get(date=timezone.localdate()).count == 1
+
+
+def test_old_listing_hits_are_pruned(listing_a, hit_buffer, settings):
+    settings.LISTINGS_HIT_RETENTION_DAYS = 30
+    old = timezone.now() - datetime.timedelta(days=31)
+
+    hit_buffer.add(listing_a.id, old)
+    hit_buffer.add(listing_a.id)
+    hit_buffer.flush()
+
+    prune_listing_hits(logging.getLogger('ScheduleBatchTasks'))
+
+    assert listing_a.hits.count() == 1
+    assert listing_a.daily_hits.get(date=timezone.localdate(old)).count == 1
+
+
+def test_daily_views_message_uses_daily_totals(realtor_a, listing_a, hit_buffer):
+    for _ in range(3):
+        hit_buffer.add(listing_a.id)
+    hit_buffer.flush()
+
+    gather_daily_views(logging.getLogger('ScheduleBatchTasks'))
+
+    message = UserMessage.objects.filter(user=realtor_a[0], type='HITS').last()
+
+    assert message.message.endswith('the listing 1516 Big Cove Road was viewed 3 times')
+
+
+def test_daily_views_messages_are_written_in_constant_queries(realtor_a, realtor_b, listing_a, listing_b, listing_c,
+                                                              listing_e, django_assert_num_queries):
+    MLSNumber.objects.create(agency=realtor_a[1])
+    before = UserMessage.objects.filter(type='HITS').count()
+
+    with django_assert_num_queries(2):
+        written = write_daily_view_messages(timezone.localdate(), 0, listing_e.id + 1)
+
+    assert written == 4
+    assert UserMessage.objects.filter(type='HITS').count() == before + 4
+    assert UserMessage.objects.filter(type='HITS', user=realtor_b[0]).count() == 1
+
+
+def test_daily_views_resume_from_last_completed_chunk(realtor_a, listing_a, listing_b, listing_c, settings):
+    settings.NIGHTLY_JOBS = {'EXECUTOR': 'thread', 'WORKERS': 1, 'CHUNK_SIZE': 1}
+    logger = logging.getLogger('ScheduleBatchTasks')
+    before = UserMessage.objects.filter(type='HITS').count()
+    run = timezone.localdate().isoformat()
+
+    # a previous run finished the first chunk, then crashed
+    NightlyJobChunk.objects.create(job='gather_daily_views', run=run, start=listing_a.id, end=listing_a.id + 1)
+    NightlyJobChunk.objects.create(job='gather_daily_views', run='2000-01-01', start=0, end=1)
+
+    assert gather_daily_views(logger) == 2
+    assert UserMessage.objects.filter(type='HITS').count() == before + 2
+    assert sorted(NightlyJobChunk.objects.filter(job='gather_daily_views').values_list('start', flat=True)) == \
+        [listing_a.id, listing_b.id, listing_c.id]
+
+    # running again the same day has nothing left to do
+    assert gather_daily_views(logger) == 0
+
+
+def test_crashed_daily_views_run_is_resumed_by_command(realtor_a, listing_a, listing_b, listing_c, settings):
+    settings.NIGHTLY_JOBS = {'EXECUTOR': 'thread', 'WORKERS': 1, 'CHUNK_SIZE': 1}
+    logger = logging.getLogger('ScheduleBatchTasks')
+    before = UserMessage.objects.filter(type='HITS').count()
+    yesterday = timezone.localdate() - datetime.timedelta(days=1)
+
+    def crash_on_listing_b(date, start, end):
+        if start == listing_b.id:
+            raise DatabaseError('server closed the connection unexpectedly')
+        return write_daily_view_messages(date, start, end)
+
+    with patch('foundry_backend.api.nightly.daily_messages.write_daily_view_messages', crash_on_listing_b), \
+            pytest.raises(DatabaseError):
+        gather_daily_views(logger, yesterday)
+
+    assert get_unfinished_runs('gather_daily_views') == [yesterday.isoformat()]
+
+    # today's run finishing leaves the crashed run's progress alone
+    gather_daily_views(logger)
+    assert NightlyJobChunk.objects.filter(job='gather_daily_views', run=yesterday.isoformat()).count() == 1
+
+    out = StringIO()
+    call_command('run_nightly_job', 'gather_daily_views', stdout=out)
+
+    assert 'Finished 1 unfinished runs' in out.getvalue()
+    assert get_unfinished_runs('gather_daily_views') == []
+    assert UserMessage.objects.filter(type='HITS', message__startswith='On {}/{}/{},'.format(
+        yesterday.month, yesterday.day, yesterday.year)).count() == 3
+    assert UserMessage.objects.filter(type='HITS').count() == before + 6
+
+
+def test_resumed_daily_views_never_message_twice(realtor_a, listing_a, listing_b, listing_c, settings):
+    settings.NIGHTLY_JOBS = {'EXECUTOR': 'thread', 'WORKERS': 1, 'CHUNK_SIZE': 2}
+    logger = logging.getLogger('ScheduleBatchTasks')
+    yesterday = timezone.localdate() - datetime.timedelta(days=1)
+    date_string = 'On {}/{}/{},'.format(yesterday.month, yesterday.day, yesterday.year)
+
+    def crash_on_listing_c(date, start, end):
+        if start <= listing_c.id < end:
+            raise DatabaseError('server closed the connection unexpectedly')
+        return write_daily_view_messages(date, start, end)
+
+    with patch('foundry_backend.api.nightly.daily_messages.write_daily_view_messages', crash_on_listing_c), \
+            pytest.raises(DatabaseError):
+        gather_daily_views(logger, yesterday)
+
+    written = list(UserMessage.objects.filter(type='HITS', message__startswith=date_string)
+                   .values_list('message', flat=True))
+    assert written
+
+    # neither losing the lowest id nor a new chunk size may shift the chunks the crashed run recorded
+    listing_a.delete()
+    settings.NIGHTLY_JOBS = {'EXECUTOR': 'thread', 'WORKERS': 1, 'CHUNK_SIZE': 3}
+    call_command('run_nightly_job', 'gather_daily_views', stdout=StringIO())
+
+    messages = list(UserMessage.objects.filter(type='HITS', message__startswith=date_string)
+                    .values_list('message', flat=True))
+    # every listing, including the deleted one, was messaged about exactly once
+    assert len(messages) == len(set(messages)) == 3
+
+
+def test_chunks_cover_every_id(listing_a, listing_b, listing_c, listing_d):
+    chunks = get_chunks(Listing.objects.all(), 3)
+    first = listing_a.id - listing_a.id % 3
+
+    assert chunks == [(start, start + 3) for start in range(first, listing_d.id + 1, 3)]
+    assert chunks[0][0] <= listing_a.id and chunks[-1][1] > listing_d.id
+    assert get_chunks(Listing.objects.none(), 3) == []
+
+
+@pytest.mark.django_db
+def test_lease_is_held_until_it_expires():
+    assert acquire_lease('scheduler', 'a', 60)
+    assert acquire_lease('scheduler', 'a', 60)
+    assert not acquire_lease('scheduler', 'b', 60)
+
+    Lease.objects.filter(name='scheduler').update(expires=timezone.now() - datetime.timedelta(seconds=1))
+
+    assert acquire_lease('scheduler', 'b', 60)
+    assert not acquire_lease('scheduler', 'a', 60)
+
+    release_lease('scheduler', 'a')
+    assert Lease.objects.get(name='scheduler').owner == 'b'
+
+    release_lease('scheduler', 'b')
+    assert acquire_lease('scheduler', 'a', 60)
+
+
+@pytest.mark.django_db
+def test_only_the_lease_holder_runs_the_scheduler(settings):
+    settings.SCHEDULER_LEASE_SECONDS = 60
+    logger = logging.getLogger('ScheduleBatchTasks')
+
+    first = SchedulerLeader(logger, MagicMock())
+    second = SchedulerLeader(logger, MagicMock())
+    second.owner = 'other-host:1'
+
+    assert first.step()
+    assert not second.step()
+    first.scheduler_factory.return_value.start.assert_called_once()
+    second.scheduler_factory.assert_not_called()
+
+    # renewing the lease leaves the running scheduler alone
+    assert first.step()
+    first.scheduler_factory.assert_called_once()
+
+    # the leader stops, so the other process takes over
+    first.stop()
+    first.scheduler_factory.return_value.shutdown.assert_called_once()
+    assert second.step()
+    second.scheduler_factory.return_value.start.assert_called_once()
+
+    # a leader that loses its lease stops its scheduler
+    Lease.objects.filter(name=SchedulerLeader.LEASE_NAME).update(owner='someone-else')
+    assert not second.step()
+    second.scheduler_factory.return_value.shutdown.assert_called_once()
+
+
 def test_listing_duplicate_rooms_caught(realtor_a, setup):
     client = APIClient()
 
@@ -1178,6 +1529,168 @@ def test_showing_times_cannot_be_equal(realtor_a, listing_a, format_string, setu
     assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
+def test_showing_cannot_contain_another(listing_a, showing_a_1, format_string, realtor_a, setup):
+    client = APIClient()
+
+    realtor, _, _, token = realtor_a
+
+    start_time = datetime.datetime(year=2019, month=1, day=1, hour=11)
+    end_time = datetime.datetime(year=2019, month=1, day=1, hour=12, minute=30)
+
+    data = {
+        'agent': realtor.id,
+        'start_time': start_time.strftime(format_string),
+        'end_time': end_time.strftime(format_string)
+    }
+
+    response = perform_api_action(client.post, data, '/api/v1/listings/{}/showings/'.format(listing_a.id), token)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def _showing_data(realtor, format_string, start_hour, start_minute, end_hour, end_minute):
+    return {
+        'agent': realtor.id,
+        'start_time': datetime.datetime(year=2019, month=1, day=1, hour=start_hour, minute=start_minute)
+        .strftime(format_string),
+        'end_time': datetime.datetime(year=2019, month=1, day=1, hour=end_hour, minute=end_minute)
+        .strftime(format_string),
+    }
+
+
+def test_showings_can_be_booked_together(listing_a, showing_a_1, format_string, realtor_a, setup):
+    client = APIClient()
+
+    realtor, _, _, token = realtor_a
+
+    data = [_showing_data(realtor, format_string, 13, 0, 13, 30),
+            _showing_data(realtor, format_string, 11, 0, 11, 30),
+            _showing_data(realtor, format_string, 12, 0, 12, 30)]
+
+    path = '/api/v1/listings/{}/showings/'.format(listing_a.id)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = perform_api_action(client.post, data, path, token)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    # the conflict check is one query however many showings are booked
+    assert len([query for query in queries if query['sql'].startswith('SELECT') and
+                'FROM "database_showing"' in query['sql']]) == 1
+    assert [showing['id'] for showing in response.data] == \
+        list(Showing.objects.filter(listing=listing_a).exclude(id=showing_a_1.id).order_by('id')
+             .values_list('id', flat=True))
+    assert Showing.objects.filter(listing=listing_a).count() == 4
+
+
+def test_showings_booked_together_cannot_overlap_each_other(listing_a, showing_a_1, format_string, realtor_a, setup):
+    client = APIClient()
+
+    realtor, _, _, token = realtor_a
+
+    data = [_showing_data(realtor, format_string, 13, 0, 13, 30),
+            _showing_data(realtor, format_string, 13, 15, 13, 45)]
+
+    response = perform_api_action(client.post, data, '/api/v1/listings/{}/showings/'.format(listing_a.id), token)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert not response.data[0]
+    assert response.data[1]
+    assert Showing.objects.filter(listing=listing_a).count() == 1
+
+
+def test_showings_booked_together_are_all_or_none(listing_a, showing_a_1, format_string, realtor_a, setup):
+    client = APIClient()
+
+    realtor, _, _, token = realtor_a
+
+    data = [_showing_data(realtor, format_string, 13, 0, 13, 30),
+            _showing_data(realtor, format_string, 11, 45, 12, 15)]
+
+    response = perform_api_action(client.post, data, '/api/v1/listings/{}/showings/'.format(listing_a.id), token)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert not response.data[0]
+    assert response.data[1]
+    assert Showing.objects.filter(listing=listing_a).count() == 1
+
+
+def test_showings_booked_together_need_a_listing_and_a_showing(listing_a, format_string, realtor_a, setup):
+    client = APIClient()
+
+    realtor, _, _, token = realtor_a
+
+    response = perform_api_action(client.post, [], '/api/v1/listings/{}/showings/'.format(listing_a.id), token)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    data = [_showing_data(realtor, format_string, 13, 0, 13, 30)]
+    response = perform_api_action(client.post, data, '/api/v1/listings/{}/showings/'.format(listing_a.id + 1), token)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert not Showing.objects.exists()
+
+
+def _slot_times(slots):
+    return [(parse_datetime(slot['start']), parse_datetime(slot['end'])) for slot in slots]
+
+
+def _local_time(hour, minute=0):
+    return timezone.make_aware(datetime.datetime(year=2019, month=1, day=1, hour=hour, minute=minute))
+
+
+def test_showing_availability_is_the_gaps_between_showings(listing_a, showing_a_1, format_string, setup):
+    client = APIClient()
+
+    path = '/api/v1/listings/{}/showings/availability/'.format(listing_a.id)
+    query = {
+        'from': datetime.datetime(year=2019, month=1, day=1, hour=11).strftime(format_string),
+        'to': datetime.datetime(year=2019, month=1, day=1, hour=13).strftime(format_string),
+    }
+
+    response = client.get(path, query)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert _slot_times(response.data) == [(_local_time(11), _local_time(11, 30)), (_local_time(12), _local_time(13))]
+
+    response = client.get(path, {**query, 'duration': 45})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert _slot_times(response.data) == [(_local_time(12), _local_time(13))]
+
+
+def test_showing_availability_needs_a_time_range(listing_a, format_string, setup):
+    client = APIClient()
+
+    path = '/api/v1/listings/{}/showings/availability/'.format(listing_a.id)
+    query = {
+        'from': datetime.datetime(year=2019, month=1, day=1, hour=13).strftime(format_string),
+        'to': datetime.datetime(year=2019, month=1, day=1, hour=11).strftime(format_string),
+    }
+
+    assert client.get(path, query).status_code == status.HTTP_400_BAD_REQUEST
+    assert client.get(path, {'from': query['to']}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_showing_availability_of_several_listings_is_one_query(listing_a, listing_b, showing_a_1, format_string, setup):
+    client = APIClient()
+
+    query = {
+        'listings': '{},{}'.format(listing_a.id, listing_b.id),
+        'from': datetime.datetime(year=2019, month=1, day=1, hour=11).strftime(format_string),
+        'to': datetime.datetime(year=2019, month=1, day=1, hour=13).strftime(format_string),
+    }
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/v1/listings/showing_availability/', query)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [availability['listing'] for availability in response.data] == sorted([listing_a.id, listing_b.id])
+
+    slots = {availability['listing']: _slot_times(availability['slots']) for availability in response.data}
+    assert slots[listing_a.id] == [(_local_time(11), _local_time(11, 30)), (_local_time(12), _local_time(13))]
+    assert slots[listing_b.id] == [(_local_time(11), _local_time(13))]
+
+    assert len([query for query in queries if 'FROM "database_showing"' in query['sql']]) == 1
+
+
 def test_user_can_retrieve_own_messages(realtor_a, setup):
     client = APIClient()
 
@@ -1404,6 +1917,841 @@ def test_admin_can_create_iam_policy_statement_condition(client, admin_user, pol
     assert response.status_code == status.HTTP_201_CREATED
 
 
+def test_policy_cache_serves_repeat_lookups_without_queries(policy: Tuple[IAMPolicy, dict],
+                                                            django_assert_num_queries, setup):
+    statements = policy_cache.get_policy_statements('an-example-policy')
+
+    with django_assert_num_queries(0):
+        assert policy_cache.get_policy_statements('an-example-policy') == statements
+        assert policy_cache.get_policy_statements('default') is not None
+        assert policy_cache.get_policy_statements('no-such-policy') is None
+
+
+def test_policy_cache_is_invalidated_on_change(policy: Tuple[IAMPolicy, dict], setup):
+    statement = policy[0].statements.first()
+    version = policy_cache.get_version()
+
+    assert policy_cache.get_policy_statements('an-example-policy')[0]['principal'] == ['*']
+
+    IAMPolicyStatementPrincipal.objects.create(statement=statement, value='group:admin')
+
+    assert policy_cache.get_version() > version
+    assert policy_cache.get_policy_statements('an-example-policy')[0]['principal'] == ['*', 'group:admin']
+
+    statement.conditions.all().delete()
+
+    assert policy_cache.get_policy_statements('an-example-policy')[0]['condition'] == []
+
+
+def test_policy_cache_notices_changes_from_other_workers(policy: Tuple[IAMPolicy, dict], setup):
+    policy_cache.refresh()
+    policy_cache.get_policy_statements('an-example-policy')
+    version = policy_cache.get_version()
+
+    # another worker's write: the generation moves, but no signal fires in this process
+    policy_cache.bump_generation()
+    policy_cache.refresh()
+
+    assert policy_cache.get_version() > version
+
+
+def test_policy_cache_skips_reload_when_generation_is_unchanged(policy: Tuple[IAMPolicy, dict],
+                                                                django_assert_num_queries, setup):
+    policy_cache.refresh()
+    policy_cache.get_policy_statements('an-example-policy')
+    version = policy_cache.get_version()
+
+    with django_assert_num_queries(1):
+        policy_cache.refresh()
+
+    assert policy_cache.get_version() == version
+
+
+def test_iam_policy_writes_bump_generation(admin_user, policy: Tuple[IAMPolicy, dict], setup):
+    client = APIClient()
+    generation = policy_cache.get_generation()
+
+    response = perform_api_action(
+        client.post,
+        {'value': 'group:plebes'},
+        '/api/v1/iam_policies/{}/statements/{}/principals/'.format(policy[0].id, policy[0].statements.first().id),
+        admin_user[1]
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert policy_cache.get_generation() == generation + 1
+
+
+@pytest.mark.django_db
+def test_bootstrap_only_reloads_changed_policies(tmp_path, settings):
+    logger = logging.getLogger('AccessPolicyManager')
+
+    with open(os.path.join(settings.BASE_DIR, settings.PERMISSIONS_JSON), 'r') as permissions_file:
+        permissions_data = json.loads(permissions_file.read())
+
+    permissions_path = tmp_path / 'permissions.json'
+    permissions_path.write_text(json.dumps(permissions_data))
+    settings.PERMISSIONS_JSON = str(permissions_path)
+
+    assert bootstrap(logger)
+    assert IAMPolicy.objects.filter(name='default').exists()
+    assert User.objects.filter(username=settings.ADMIN_USERNAME).exists()
+
+    with patch('foundry_backend.api.startup.load_iam_policies') as load:
+        assert not bootstrap(logger)
+        load.assert_not_called()
+
+    # the policies were changed through the API, which is not a reason to reload them
+    policy_cache.bump_generation()
+    assert not bootstrap(logger)
+
+    # the permissions file was changed
+    permissions_data[0]['notes'] = 'changed'
+    permissions_path.write_text(json.dumps(permissions_data))
+    assert bootstrap(logger)
+    assert IAMPolicy.objects.get(name=permissions_data[0]['name']).notes == 'changed'
+
+
+def test_policies_changed_through_the_api_survive_a_restart(admin_user, tmp_path, settings, setup):
+    client = APIClient()
+    logger = logging.getLogger('AccessPolicyManager')
+
+    def get_principals(name):
+        statement = IAMPolicy.objects.get(name=name).statements.order_by('id').first()
+        return sorted(statement.principals.values_list('value', flat=True))
+
+    edited = IAMPolicy.objects.get(name='mls-number-access-policy')
+    response = perform_api_action(
+        client.post,
+        {'value': 'group:custom'},
+        '/api/v1/iam_policies/{}/statements/{}/principals/'.format(edited.id, edited.statements.order_by('id')[0].id),
+        admin_user[1]
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+
+    assert not bootstrap(logger)
+    assert get_principals('mls-number-access-policy') == ['*', 'group:custom']
+
+    # a new permissions file updates the policies it still owns, but not the edited one
+    with open(os.path.join(settings.BASE_DIR, settings.PERMISSIONS_JSON), 'r') as permissions_file:
+        permissions_data = json.loads(permissions_file.read())
+
+    for document in permissions_data:
+        document['notes'] = 'changed'
+
+    permissions_path = tmp_path / 'permissions.json'
+    permissions_path.write_text(json.dumps(permissions_data))
+    settings.PERMISSIONS_JSON = str(permissions_path)
+
+    assert bootstrap(logger)
+    assert get_principals('mls-number-access-policy') == ['*', 'group:custom']
+    assert IAMPolicy.objects.get(name='mls-number-access-policy').notes != 'changed'
+    assert IAMPolicy.objects.get(name='default').notes == 'changed'
+
+    # unless told to
+    load_iam_policies(logger, force=True)
+    assert get_principals('mls-number-access-policy') == ['*']
+    assert IAMPolicy.objects.get(name='mls-number-access-policy').notes == 'changed'
+
+
+def test_bootstrap_command(db):
+    with patch('foundry_backend.api.management.commands.bootstrap.bootstrap', return_value=False) as mocked:
+        out = StringIO()
+        call_command('bootstrap', stdout=out)
+
+    mocked.assert_called_once()
+    assert 'up to date' in out.getvalue()
+
+
+def test_policy_sync_leaves_unchanged_policies_alone(setup):
+    logger = logging.getLogger('AccessPolicyManager')
+    principal_ids = set(IAMPolicyStatementPrincipal.objects.values_list('id', flat=True))
+    generation = policy_cache.get_generation()
+
+    assert load_iam_policies(logger) == []
+    assert set(IAMPolicyStatementPrincipal.objects.values_list('id', flat=True)) == principal_ids
+    assert policy_cache.get_generation() == generation
+
+
+def test_policy_sync_only_writes_what_changed(setup, settings):
+    logger = logging.getLogger('AccessPolicyManager')
+
+    with open(os.path.join(settings.BASE_DIR, settings.PERMISSIONS_JSON), 'r') as permissions_file:
+        permissions_data = json.loads(permissions_file.read())
+
+    default = IAMPolicy.objects.get(name='default')
+    statement_ids = list(default.statements.order_by('id').values_list('id', flat=True))
+    untouched_ids = set(IAMPolicyStatementPrincipal.objects.exclude(statement__policy=default)
+                        .values_list('id', flat=True))
+
+    permissions_data[0]['statements'][0]['principals'].append({'value': 'group:auditor'})
+    permissions_data[0]['statements'].append({'notes': 'new', 'actions': ['list'], 'effect': 'allow',
+                                              'principals': [{'value': '*'}], 'conditions': []})
+    permissions_data.append({'name': 'new-policy', 'notes': None, 'statements': []})
+
+    # a dry run reports the changes without making them
+    changes = sync_policies(permissions_data, logger, dry_run=True)
+    assert changes == ['update statement 0 of \'default\'',
+                       'create statement {} of \'default\''.format(len(statement_ids)),
+                       'create policy \'new-policy\'']
+    assert not IAMPolicy.objects.filter(name='new-policy').exists()
+
+    assert sync_policies(permissions_data, logger) == changes
+    assert list(default.statements.order_by('id').values_list('id', flat=True))[:len(statement_ids)] == statement_ids
+    assert IAMPolicyStatementPrincipal.objects.filter(statement_id=statement_ids[0], value='group:auditor').exists()
+    assert untouched_ids <= set(IAMPolicyStatementPrincipal.objects.values_list('id', flat=True))
+
+    assert sync_policies(permissions_data, logger) == []
+
+
+def test_sync_iam_policies_dry_run_command(setup):
+    IAMPolicy.objects.filter(name='default').delete()
+    out = StringIO()
+
+    call_command('sync_iam_policies', '--dry-run', stdout=out)
+
+    assert 'create policy \'default\'' in out.getvalue()
+    assert 'Would make' in out.getvalue()
+    assert not IAMPolicy.objects.filter(name='default').exists()
+
+
+def test_compiled_policies_agree_with_drf_access_policy():
+    output = StringIO()
+
+    call_command('benchmark_access_policies', iterations=1, stdout=output)
+
+    assert 'speedup' in output.getvalue()
+
+
+def test_compiled_policy_only_looks_up_groups_when_needed():
+    access_policy = MagicMock()
+    access_policy.get_user_group_values.return_value = ['admin']
+    compiled = CompiledPolicy([
+        {'effect': 'allow', 'action': ['<safe_methods>'], 'principal': ['*'], 'condition': []},
+        {'effect': 'allow', 'action': ['*'], 'principal': ['group:admin'], 'condition': []},
+    ])
+    request = SimpleNamespace(user=SimpleNamespace(id=1, is_anonymous=False), method='GET')
+
+    assert compiled.has_permission(access_policy, request, None, 'list')
+    access_policy.get_user_group_values.assert_not_called()
+
+    request.method = 'DELETE'
+
+    assert compiled.has_permission(access_policy, request, None, 'destroy')
+    access_policy.get_user_group_values.assert_called_once()
+
+
+def count_list_queries(client: APIClient, path: str) -> int:
+    # the first request warms the policy cache, so only the second is counted
+    assert client.get(path).status_code == status.HTTP_200_OK
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(path)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data) > 0
+
+    return len(queries)
+
+
+def add_listing(realtor: MLSNumber, street_number: str) -> Listing:
+    address = Address.objects.create(street_number=street_number, street='Query Count Lane', postal_code='35801',
+                                     locality='Huntsville', state_code='AL', state='Alabama')
+    listing = Listing.objects.create(asking_price=100000, agent=realtor, description='Counting queries')
+    prop = Property.objects.create(address=address, type='HOUSE', square_footage=1000, acreage=1, listing=listing)
+
+    for name in ('Kitchen', 'Den'):
+        Room.objects.create(property=prop, name=name, type='KITCHEN', square_footage=100)
+        NearbyAttraction.objects.create(property=prop, name=name, type='SCHOOL_ELEM')
+
+    Showing.objects.create(listing=listing, agent=realtor,
+                           start_time=timezone.now() + datetime.timedelta(days=int(street_number)),
+                           end_time=timezone.now() + datetime.timedelta(days=int(street_number), hours=1))
+    ListingImage.objects.create(listing=listing, image='listing.jpg')
+
+    return listing
+
+
+def add_realtor(agency: Agency, username: str) -> MLSNumber:
+    user = User.objects.create_user(username=username, email='{}@email.com'.format(username), password='password')
+    return MLSNumber.objects.create(user=user, agency=agency)
+
+
+def test_listing_list_queries_do_not_grow_with_listings(realtor_a, setup, no_response_cache):
+    client = APIClient()
+    add_listing(realtor_a[2], '1')
+    listing = add_listing(realtor_a[2], '2')
+
+    paths = [
+        '/api/v1/listings/',
+        '/api/v1/listings/{}/property/'.format(listing.id),
+        '/api/v1/listings/{}/showings/'.format(listing.id),
+        '/api/v1/listing_images/',
+    ]
+    before = [count_list_queries(client, path) for path in paths]
+
+    for street_number in range(3, 8):
+        add_listing(realtor_a[2], str(street_number))
+
+    assert [count_list_queries(client, path) for path in paths] == before
+
+
+def test_property_children_list_queries_do_not_grow(realtor_a, setup):
+    client = APIClient()
+    listing = add_listing(realtor_a[2], '1')
+    prop = listing.property
+
+    paths = [
+        '/api/v1/listings/{}/property/{}/rooms/'.format(listing.id, prop.id),
+        '/api/v1/listings/{}/property/{}/nearby_attractions/'.format(listing.id, prop.id),
+    ]
+    before = [count_list_queries(client, path) for path in paths]
+
+    for index in range(5):
+        Room.objects.create(property=prop, name='Room {}'.format(index), type='BEDROOM', square_footage=100)
+        NearbyAttraction.objects.create(property=prop, name='Park {}'.format(index), type='SCHOOL_HIGH')
+
+    assert [count_list_queries(client, path) for path in paths] == before
+
+
+def test_agency_list_queries_do_not_grow_with_realtors(realtor_a, realtor_b, setup, no_response_cache):
+    client = APIClient()
+    agency = realtor_a[1]
+
+    paths = [
+        '/api/v1/agencies/',
+        '/api/v1/agencies/{}/mls_numbers/'.format(agency.id),
+        '/api/v1/mls_numbers/',
+    ]
+    before = [count_list_queries(client, path) for path in paths]
+
+    for index in range(5):
+        add_realtor(agency, 'realtor_a_{}'.format(index))
+        add_realtor(realtor_b[1], 'realtor_b_{}'.format(index))
+
+    assert [count_list_queries(client, path) for path in paths] == before
+
+
+def test_iam_policy_list_queries_do_not_grow_with_statements(policy: Tuple[IAMPolicy, dict], setup):
+    client = APIClient()
+    policy_obj = policy[0]
+
+    paths = [
+        '/api/v1/iam_policies/',
+        '/api/v1/iam_policies/{}/statements/'.format(policy_obj.id),
+    ]
+    before = [count_list_queries(client, path) for path in paths]
+
+    for index in range(5):
+        statement = IAMPolicyStatement.objects.create(policy=policy_obj, notes='Statement {}'.format(index),
+                                                      actions=['list'], effect='allow')
+        IAMPolicyStatementPrincipal.objects.create(statement=statement, value='*')
+        IAMPolicyStatementCondition.objects.create(statement=statement, value='true_is_not_false')
+
+    assert [count_list_queries(client, path) for path in paths] == before
+
+
+def test_message_list_queries_do_not_grow(realtor_a, setup):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token {}'.format(realtor_a[3]))
+
+    before = count_list_queries(client, '/api/v1/messages/')
+
+    for index in range(5):
+        UserMessage.objects.create(user=realtor_a[0], message='Message {}'.format(index), type='HITS')
+
+    assert count_list_queries(client, '/api/v1/messages/') == before
+
+
+def test_query_plan_follows_nested_serializers():
+    plan = plan_serializer(serializers.ListingSerializer())
+
+    assert plan.select_related == ['property', 'property__address']
+    assert [prefetch.prefetch_to for prefetch in plan.prefetch_related] == ['property__rooms',
+                                                                           'property__nearby_attractions']
+    assert {'id', 'agent', 'property__square_footage', 'property__address__street'} <= set(plan.only)
+    assert 'property__home_alarm' not in plan.only
+
+    mls_numbers = plan_serializer(serializers.AgencySerializer()).prefetch_related[0]
+
+    assert mls_numbers.prefetch_to == 'mls_numbers'
+    assert mls_numbers.queryset.query.select_related == {'user': {}}
+
+
+def test_query_plan_loads_every_field_for_computed_fields():
+    class ListingWithAgentSerializer(serializers.ListingSerializer):
+        agent_name = rest_serializers.SerializerMethodField()
+
+        def get_agent_name(self, listing):
+            return listing.agent.user.username
+
+    plan = plan_serializer(ListingWithAgentSerializer())
+
+    assert plan.only is None
+    assert plan.select_related == ['property', 'property__address']
+
+
+def test_compiled_serializers_render_the_same_json(realtor_a, realtor_b, setup):
+    listing = add_listing(realtor_a[2], '1')
+    add_listing(realtor_b[2], '2')
+    renderer = JSONRenderer()
+
+    cases = [
+        (serializers.ListingSerializer, Listing.objects.all()),
+        (serializers.PropertySerializer, Property.objects.all()),
+        (serializers.AgencySerializer, Agency.objects.all()),
+    ]
+
+    for serializer_class, queryset in cases:
+        compiled = CompiledSerializer(serializer_class())
+
+        assert renderer.render(compiled.many(queryset)) == renderer.render(serializer_class(queryset, many=True).data)
+
+    response = APIClient().get('/api/v1/listings/{}/'.format(listing.id))
+    listing.refresh_from_db()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == json.loads(renderer.render(serializers.ListingSerializer(listing).data))
+    assert len(response.json()['property']['rooms']) == 2
+
+
+def test_benchmark_serializers_command():
+    out = StringIO()
+
+    call_command('benchmark_serializers', '--count', '5', '--iterations', '2', stdout=out)
+
+    assert 'speedup' in out.getvalue()
+
+
+def test_benchmark_listing_filters_command(setup):
+    out = StringIO()
+    before = Listing.objects.count()
+
+    call_command('benchmark_listing_filters', '--count', '50', '--iterations', '1', stdout=out)
+
+    assert 'open, zip code, price range' in out.getvalue()
+    assert Listing.objects.count() == before
+
+
+def test_public_listing_reads_are_cached(realtor_a, listing_a, setup, django_assert_max_num_queries):
+    client = APIClient()
+
+    first = client.get('/api/v1/listings/', {'open': True, 'zip_code': '35801'})
+
+    # only the permission check runs, whatever order the filters come in
+    with django_assert_max_num_queries(1):
+        second = client.get('/api/v1/listings/?zip_code=35801&open=True')
+
+    assert first.json() == second.json()
+
+    # changing a listing drops the cached responses
+    add_listing(realtor_a[2], '1')
+    assert len(client.get('/api/v1/listings/', {'open': True, 'zip_code': '35801'}).json()) == 2
+
+
+def test_cached_listing_pages_link_to_the_requested_host(realtor_a, setup, settings):
+    settings.ALLOWED_HOSTS = ['*']
+    client = APIClient()
+    for street_number in range(1, 3):
+        add_listing(realtor_a[2], str(street_number))
+
+    internal = client.get('/api/v1/listings/?page_size=1', HTTP_HOST='internal:8000').json()
+    public = client.get('/api/v1/listings/?page_size=1', HTTP_HOST='public.example.com').json()
+
+    assert internal['next'].startswith('http://internal:8000/')
+    assert public['next'].startswith('http://public.example.com/')
+
+
+def test_agency_reads_are_invalidated_by_realtor_changes(realtor_a, setup):
+    client = APIClient()
+    agency = realtor_a[1]
+
+    assert len(client.get('/api/v1/agencies/{}/'.format(agency.id)).json()['mls_numbers']) == 1
+
+    add_realtor(agency, 'new_realtor')
+
+    assert len(client.get('/api/v1/agencies/{}/'.format(agency.id)).json()['mls_numbers']) == 2
+
+
+def test_agency_reads_are_invalidated_by_realtor_user_changes(realtor_a, setup):
+    client = APIClient()
+    agency = realtor_a[1]
+    user = realtor_a[0]
+
+    def get_user_info():
+        return client.get('/api/v1/agencies/{}/'.format(agency.id)).json()['mls_numbers'][0]['user_info']
+
+    get_user_info()
+
+    # logging in saves only last_login, which agencies do not show
+    with patch('foundry_backend.api.response_cache.invalidate') as invalidate:
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+    invalidate.assert_not_called()
+
+    user.first_name = 'Renamed'
+    user.save()
+
+    assert get_user_info()['first_name'] == 'Renamed'
+
+
+def test_only_public_actions_are_cacheable():
+    policy = CompiledPolicy([
+        {'effect': 'allow', 'action': ['<safe_methods>'], 'principal': ['*'], 'condition': []},
+        {'effect': 'allow', 'action': ['update'], 'principal': ['*'], 'condition': ['is_agent_in_agency']},
+        {'effect': 'allow', 'action': ['destroy'], 'principal': ['authenticated'], 'condition': []},
+        {'effect': 'deny', 'action': ['retrieve'], 'principal': ['anonymous'], 'condition': ['is_not_weekend']},
+    ], lambda _: None)
+
+    assert policy.is_public('list', True)
+    assert not policy.is_public('retrieve', True)
+    assert not policy.is_public('update', False)
+    assert not policy.is_public('destroy', False)
+
+
+def test_unchanged_listing_polls_get_not_modified(realtor_a, setup, django_assert_max_num_queries):
+    client = APIClient()
+    listing = add_listing(realtor_a[2], '1')
+    paths = ['/api/v1/listings/{}/'.format(listing.id), '/api/v1/listings/{}/property/'.format(listing.id)]
+
+    for path in paths:
+        response = client.get(path)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        # the policy generation and the listing's last_modified
+        with django_assert_max_num_queries(2):
+            assert client.get(path, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        assert client.get(path, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == status.HTTP_304_NOT_MODIFIED
+
+    etag = client.get(paths[0])['ETag']
+    Room.objects.create(property=listing.property, name='Attic', type='BEDROOM', square_footage=100)
+
+    response = client.get(paths[0], HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response['ETag'] != etag
+    assert len(response.json()['property']['rooms']) == 3
+
+
+def test_nested_property_list_only_shows_the_listings_property(listing_a, listing_b, setup):
+    response = APIClient().get('/api/v1/listings/{}/property/'.format(listing_a.id))
+
+    assert [prop['id'] for prop in response.json()] == [listing_a.property.id]
+
+
+def walk_pages(client: APIClient, path: str) -> Tuple[List[int], List[int]]:
+    ids, query_counts = [], []
+
+    while path:
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'COUNT(' not in ' '.join(query['sql'] for query in queries)
+
+        ids += [item['id'] for item in response.json()['results']]
+        query_counts.append(len(queries))
+        path = response.json()['next']
+
+    return ids, query_counts
+
+
+def test_listing_cursor_pages_walk_every_listing_once(realtor_a, setup, no_response_cache):
+    client = APIClient()
+    listings = [add_listing(realtor_a[2], str(street_number)) for street_number in range(1, 8)]
+
+    # ties on date_posted are broken by id
+    Listing.objects.filter(id__in=[listing.id for listing in listings[2:5]]) \
+        .update(date_posted=listings[2].date_posted)
+    expected = list(Listing.objects.order_by('-date_posted', '-id').values_list('id', flat=True))
+
+    client.get('/api/v1/listings/?page_size=2')
+    ids, query_counts = walk_pages(client, '/api/v1/listings/?page_size=2')
+
+    assert ids == expected
+    assert len(query_counts) == 4
+    assert len(set(query_counts)) == 1
+
+    # without a cursor or page size, the list is unchanged
+    assert [item['id'] for item in client.get('/api/v1/listings/').json()] == \
+        list(Listing.objects.order_by('id').values_list('id', flat=True))
+
+
+def test_listing_cursor_pages_can_count_approximately(realtor_a, setup):
+    client = APIClient()
+    for street_number in range(1, 4):
+        add_listing(realtor_a[2], str(street_number))
+
+    body = client.get('/api/v1/listings/?page_size=2&count=approximate').json()
+
+    assert body['count'] == 3
+    assert not body['count_is_estimate']
+    assert len(body['results']) == 2
+    assert 'count=' not in body['next']
+
+    assert client.get('/api/v1/listings/?cursor=not-a-cursor').status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_ranked_listing_searches_cannot_be_cursor_paged(realtor_a, setup, no_response_cache):
+    client = APIClient()
+    for street_number in range(1, 4):
+        add_listing(realtor_a[2], str(street_number))
+
+    cursor = parse_qs(urlparse(client.get('/api/v1/listings/?page_size=1').json()['next']).query)['cursor'][0]
+
+    for query in ({'q': 'house', 'cursor': cursor}, {'q': 'house', 'page_size': 1}):
+        response = client.get('/api/v1/listings/', query)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'q' in response.json()
+
+    # a blank search is no search
+    assert client.get('/api/v1/listings/', {'q': ' ', 'page_size': 1}).status_code == status.HTTP_200_OK
+
+
+def test_user_messages_and_realtors_can_be_paged(realtor_a, realtor_b, setup):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token {}'.format(realtor_a[3].key))
+
+    ids, _ = walk_pages(client, '/api/v1/messages/?page_size=1')
+    assert ids == list(realtor_a[0].messages.order_by('-id').values_list('id', flat=True))
+
+    ids, _ = walk_pages(client, '/api/v1/mls_numbers/?page_size=1')
+    assert ids == list(MLSNumber.objects.order_by('id').values_list('id', flat=True))
+
+
+def test_listing_search_rows_follow_their_listing(realtor_a, setup):
+    listing = add_listing(realtor_a[2], '1')
+    prop = listing.property
+
+    Room.objects.create(property=prop, name='Bedroom', type='BEDROOM', square_footage=100)
+    Room.objects.create(property=prop, name='Bathroom', type='BATHROOM', square_footage=50)
+    Room.objects.create(property=prop, name='Powder Room', type='HALF_BATHROOM', square_footage=20)
+    prop.address.postal_code = '35802'
+    prop.address.save()
+
+    search = ListingSearch.objects.get(listing=listing)
+    assert (search.postal_code, search.square_footage, search.bedrooms, search.bathrooms) == \
+        ('35802', 1000, 1, Decimal('1.5'))
+
+    prop.delete()
+    assert ListingSearch.objects.get(listing=listing).square_footage is None
+
+    listing.delete()
+    assert not ListingSearch.objects.filter(listing_id=listing.id).exists()
+
+
+def test_listing_filters_read_search_rows(realtor_a, setup):
+    client = APIClient()
+    listing = add_listing(realtor_a[2], '1')
+    add_listing(realtor_a[2], '2')
+    Room.objects.create(property=listing.property, name='Bedroom', type='BEDROOM', square_footage=100)
+
+    ListingSearch.objects.all().delete()
+    out = StringIO()
+    call_command('rebuild_listing_search', stdout=out)
+    assert 'of 2 listings' in out.getvalue()
+
+    response = client.get('/api/v1/listings/', {'zip_code': '35801', 'bedrooms_min': 1, 'asking_price_max': 100000})
+
+    assert [item['id'] for item in response.json()] == [listing.id]
+    assert client.get('/api/v1/listings/', {'zip_code': '35802'}).json() == []
+
+
+def test_listings_can_be_searched_by_description(realtor_a, setup):
+    client = APIClient()
+    pool = add_listing(realtor_a[2], '1')
+    pools = add_listing(realtor_a[2], '2')
+    cul_de_sac = add_listing(realtor_a[2], '3')
+
+    pool.description = 'Hardwood floors, a pool, a big yard, a new roof and a two car garage close to the schools'
+    pool.save()
+    pools.description = 'Pools: a pool by the house, a pool by the barn. Hardwood floors'
+    pools.save()
+    cul_de_sac.description = 'Quiet cul-de-sac, with a pool'
+    cul_de_sac.save()
+
+    def search(**params):
+        return [item['id'] for item in client.get('/api/v1/listings/', params).json()]
+
+    # more mentions and shorter descriptions rank higher
+    assert search(q='pool') == [pools.id, cul_de_sac.id, pool.id]
+    assert search(q='hardwood POOL') == [pools.id, pool.id]
+    assert search(q='cul-de-sac') == [cul_de_sac.id]
+    assert search(q='"unbalanced') == []
+
+    pools.property.square_footage = 5000
+    pools.property.save()
+    assert search(q='pool', square_footage_max=1000) == [cul_de_sac.id, pool.id]
+
+    cul_de_sac.delete()
+    assert search(q='pool') == [pools.id, pool.id]
+
+
+def test_text_index_can_be_rebuilt(listing_a, listing_b, setup):
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM listing_text')
+
+    out = StringIO()
+    call_command('rebuild_text_index', stdout=out)
+
+    assert 'of 2 listings' in out.getvalue()
+    assert search_listings(Listing.objects.all(), listing_a.description.split()[0]).filter(id=listing_a.id).exists()
+
+
+def test_benchmark_text_search_command(setup):
+    out = StringIO()
+
+    call_command('benchmark_text_search', '--count', '50', '--iterations', '1', stdout=out)
+
+    assert 'icontains' in out.getvalue()
+
+
+def test_geohash_cells_cover_their_box():
+    assert geo.encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+
+    box = (34.70, -86.65, 34.75, -86.55)
+    cells = geo.covering_cells(box)
+
+    assert 1 < len(cells) <= 16
+    for latitude in (34.70, 34.725, 34.75):
+        for longitude in (-86.65, -86.6, -86.55):
+            assert any(geo.encode(latitude, longitude).startswith(cell) for cell in cells)
+
+    assert geo.precision_for_box(box, 16) == len(cells[0])
+    assert geo.precision_for_box((-80, -170, 80, 170), 1) == 1
+
+
+def test_listings_can_be_searched_by_location(realtor_a, setup):
+    client = APIClient()
+    ZipCentroid.objects.create(postal_code='35801', latitude=34.7257, longitude=-86.5637)
+    ZipCentroid.objects.create(postal_code='35806', latitude=34.7676, longitude=-86.6900)
+
+    downtown = add_listing(realtor_a[2], '1')
+    downtown.property.address.save()
+    northwest = add_listing(realtor_a[2], '2')
+    northwest.property.address.postal_code = '35806'
+    northwest.property.address.save()
+    nowhere = add_listing(realtor_a[2], '3')
+    nowhere.property.address.postal_code = '99999'
+    nowhere.property.address.save()
+
+    assert northwest.property.address.geohash == geo.encode(34.7676, -86.6900)
+    assert nowhere.property.address.latitude is None
+
+    def search(**params):
+        return sorted(item['id'] for item in client.get('/api/v1/listings/', params).json())
+
+    # the two are about 7.8 miles apart
+    assert search(near='34.7257,-86.5637', radius=1) == [downtown.id]
+    assert search(near='34.7257,-86.5637', radius=8) == [downtown.id, northwest.id]
+    assert search(near='34.7676,-86.6900') == [northwest.id]
+    assert search(bbox='-86.7,34.7,-86.6,34.8') == [northwest.id]
+    assert search(bbox='-86.7,34.7,-86.5,34.8', open=True) == [downtown.id, northwest.id]
+
+    assert client.get('/api/v1/listings/', {'near': '34.7'}).status_code == status.HTTP_400_BAD_REQUEST
+    assert client.get('/api/v1/listings/', {'near': '134.7,-86.5'}).status_code == status.HTTP_400_BAD_REQUEST
+
+    # an inverted box is an error, not an empty search
+    for inverted in ('-86.6,34.7,-86.7,34.8', '-86.7,34.8,-86.6,34.7'):
+        response = client.get('/api/v1/listings/', {'bbox': inverted})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'bbox' in response.json()
+
+
+def test_zip_centroids_can_be_loaded(listing_a, setup):
+    client = APIClient()
+    out = StringIO()
+    last_modified = Listing.objects.get(pk=listing_a.pk).last_modified
+
+    near = {'near': '34.73,-86.58', 'radius': 10}
+    assert client.get('/api/v1/listings/', near).json() == []
+
+    call_command('load_zip_centroids', stdout=out)
+
+    # the cached search and the listing's ETag are both dropped
+    assert [item['id'] for item in client.get('/api/v1/listings/', near).json()] == [listing_a.id]
+    assert Listing.objects.get(pk=listing_a.pk).last_modified > last_modified
+
+    address = listing_a.property.address
+    address.refresh_from_db()
+    assert 'moved 2 addresses' in out.getvalue()
+    assert address.geohash == geo.encode(address.latitude, address.longitude)
+    assert ListingSearch.objects.get(listing=listing_a).geohash == address.geohash
+
+    # loading the same file again is skipped, unless forced
+    out = StringIO()
+    with patch.object(ZipCentroid.objects, 'bulk_create') as bulk_create:
+        call_command('load_zip_centroids', stdout=out)
+    bulk_create.assert_not_called()
+    assert 'up to date' in out.getvalue()
+
+    out = StringIO()
+    call_command('load_zip_centroids', '--force', stdout=out)
+    assert 'moved 0 addresses' in out.getvalue()
+
+
+def test_listings_can_be_clustered_for_a_map(realtor_a, setup, no_response_cache):
+    client = APIClient()
+    ZipCentroid.objects.create(postal_code='35801', latitude=34.7257, longitude=-86.5637)
+    ZipCentroid.objects.create(postal_code='35806', latitude=34.7676, longitude=-86.6900)
+
+    downtown = [add_listing(realtor_a[2], str(street_number)) for street_number in range(1, 4)]
+    for listing, price in zip(downtown, (100000, 200000, 300000)):
+        listing.asking_price = price
+        listing.save()
+        listing.property.address.save()
+
+    northwest = add_listing(realtor_a[2], '4')
+    northwest.property.address.postal_code = '35806'
+    northwest.property.address.save()
+
+    def clusters(**params):
+        response = client.get('/api/v1/listings/clusters/', {'bbox': '-86.8,34.6,-86.5,34.8', **params})
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    city = clusters(zoom=3)
+    assert len(city) == 1
+    assert city[0]['count'] == 4
+    assert (city[0]['min_price'], city[0]['max_price'], city[0]['listing']) == (100000, 300000, None)
+
+    streets = clusters(zoom=14)
+    assert sorted(cluster['count'] for cluster in streets) == [1, 3]
+    single = next(cluster for cluster in streets if cluster['count'] == 1)
+    assert single['listing'] == northwest.id
+    assert (single['latitude'], single['longitude']) == (34.7676, -86.6900)
+
+    assert [cluster['count'] for cluster in clusters(zoom=14, asking_price_min=150000)] == [2]
+    assert clusters(zoom=14, bbox='-86.6,34.7,-86.5,34.8')[0]['count'] == 3
+
+    assert client.get('/api/v1/listings/clusters/', {'zoom': 3}).status_code == status.HTTP_400_BAD_REQUEST
+    assert client.get('/api/v1/listings/clusters/', {'bbox': '-86.8,34.6,-86.5,34.8'}).status_code == \
+        status.HTTP_400_BAD_REQUEST
+
+
+def test_clusters_of_a_large_bbox_stay_bounded_at_high_zoom(realtor_a, setup, no_response_cache):
+    client = APIClient()
+
+    for number in range(6):
+        postal_code = '3000{}'.format(number)
+        ZipCentroid.objects.create(postal_code=postal_code, latitude=31 + number * 1.5, longitude=-89 + number * 1.5)
+
+        listing = add_listing(realtor_a[2], str(number))
+        listing.property.address.postal_code = postal_code
+        listing.property.address.save()
+
+    params = {'bbox': '-90,30,-80,40', 'zoom': 14}
+    assert len(client.get('/api/v1/listings/clusters/', params).json()) == 6
+
+    with patch.object(views.ListingViewSet, 'max_cluster_cells', 4):
+        clusters = client.get('/api/v1/listings/clusters/', params).json()
+
+    assert len(clusters) <= 4
+    assert sum(cluster['count'] for cluster in clusters) == 6
+
+
 def test_listings_path_generator():
     uuid = 'xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx'
     filename = 'image.jpeg'
@@ -1457,3 +2805,12 @@ def test_wsgi():
 
         assert mocked_wsgi.called_once()
         assert wsgi.application == 'totally_the_right_type'
+
+
+def test_gunicorn_workers_start_up_after_loading_the_app():
+    from foundry_backend import gunicorn_config
+
+    with patch('foundry_backend.api.startup.start_worker') as start_worker:
+        gunicorn_config.post_worker_init(MagicMock())
+
+    start_worker.assert_called_once_with()
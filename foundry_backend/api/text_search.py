@@ -0,0 +1,94 @@
+from typing import Iterable, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foundry_backend.database import models
+
+TABLE = models.ListingText._meta.db_table
+
+
+def is_indexed() -> bool:
+    """
+    Whether listing descriptions have a text index. Only SQLite has one (FTS5)
+    """
+    return connection.vendor == 'sqlite'
+
+
+def to_match_query(text: str) -> str:
+    """
+    Turn what a buyer typed into an FTS5 query matching listings that have every word
+
+    Each word is quoted, so that punctuation is never read as query syntax: "cul-de-sac" becomes the phrase
+    cul de sac rather than a NOT.
+
+    :param text: the search, e.g. 'pool cul-de-sac'
+    :return: the query, e.g. '"pool" "cul-de-sac"'
+    """
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+def search_listings(queryset: QuerySet, text: Optional[str]) -> QuerySet:
+    """
+    Filter listings to those whose description has every word of a search, best matches first
+
+    :param queryset: the listings to search
+    :param text: the search
+    :return: the matching listings, ordered by rank on SQLite
+    """
+    if not text or not text.split():
+        return queryset
+
+    if not is_indexed():
+        for word in text.split():
+            queryset = queryset.filter(description__icontains=word)
+        return queryset
+
+    return queryset.filter(text__description__match=to_match_query(text)).order_by('text__rank', '-id')
+
+
+def index_listings(listings: Iterable[Tuple[int, str]]):
+    """
+    Replace the indexed descriptions of some listings
+
+    :param listings: (id, description) pairs
+    """
+    listings = list(listings)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany('DELETE FROM {} WHERE rowid = %s'.format(TABLE), [(pk,) for pk, _ in listings])
+        cursor.executemany('INSERT INTO {} (rowid, description) VALUES (%s, %s)'.format(TABLE), listings)
+
+
+def rebuild_text_index() -> int:
+    """
+    Reindex every listing's description
+
+    :return: how many listings were indexed
+    """
+    if not is_indexed():
+        return 0
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(TABLE))
+        cursor.execute('INSERT INTO {} (rowid, description) SELECT id, description FROM {}'.format(
+            TABLE, models.Listing._meta.db_table))
+        # merge the index into as few b-trees as possible, so that searches read less
+        cursor.execute("INSERT INTO {0} ({0}) VALUES ('optimize')".format(TABLE))
+
+    return models.Listing.objects.count()
+
+
+@receiver(post_save, sender=models.Listing)
+def _index_listing(sender, instance, **kwargs):
+    if is_indexed():
+        index_listings([(instance.pk, instance.description)])
+
+
+@receiver(post_delete, sender=models.Listing)
+def _unindex_listing(sender, instance, **kwargs):
+    if is_indexed():
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(TABLE), [instance.pk])
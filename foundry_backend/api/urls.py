@@ -1,18 +1,8 @@
-import logging
 from django.conf.urls import url
 from django.urls import include, path
 from rest_framework_nested import routers
 from foundry_backend.api import views
 from .endpoints import permissions_functions, legal_functions
-from . import startup
-from django.db import connection
-
-tables = connection.introspection.table_names()
-if 'django_apscheduler_djangojob' in tables:
-    startup.start_nightly_tasks(logging.getLogger('ScheduleBatchTasks'))
-
-if 'api_iampolicy' in tables:
-    startup.load_iam_policies(logging.getLogger('AccessPolicyManager'))
 
 base_router = routers.SimpleRouter()
 
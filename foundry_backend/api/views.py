@@ -1,17 +1,134 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django_filters.utils import translate_validation
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
 from foundry_backend.api import models
+from foundry_backend.api.availability import get_availability
+from foundry_backend.api.compiled_serializer import CompiledSerializer
+from foundry_backend.api.conditional import ConditionalListingMixin
 from foundry_backend.api.filters import ListingFilterSet, AgencyFilterSet, ListingImageFilterSet, MLSNumberFilterSet, \
     ListingsHitFilterSet, ShowingReviewFilterSet
+from foundry_backend.api.geo import precision_for_box, precision_for_zoom
+from foundry_backend.api.hits import get_hit_buffer, record_daily_hits
+from foundry_backend.api.listing_search import cluster_listings
+from foundry_backend.api.pagination import KeysetPagination
+from foundry_backend.api.query_plan import QueryPlan, plan_serializer
+from foundry_backend.api.response_cache import ResponseCacheMixin
 from foundry_backend.database import models as db_models
 from rest_framework import viewsets, mixins
 from foundry_backend.database.models import MLSNumber, Room, NearbyAttraction
 from . import serializers
-from .access import make_access_policy
+from .access import make_access_policy, policy_cache
 
 
-class UserMessageViewSet(viewsets.ModelViewSet):
+class IAMPolicyGenerationMixin:
+    """
+    Bumps the shared IAM policy generation after every write, so other workers drop their cached policies
+    """
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        policy_cache.bump_generation()
+        return response
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        policy_cache.bump_generation()
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        response = super().destroy(request, *args, **kwargs)
+        policy_cache.bump_generation()
+        return response
+
+
+class CachedObjectMixin:
+    """
+    Loads the target object once per request, so access policy conditions and the handler share a single fetch
+
+    Detail requests also follow the relations in `object_select_related`, which is where conditions usually look
+    """
+    object_select_related = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        if getattr(self, 'detail', False) and self.object_select_related and hasattr(queryset, 'select_related'):
+            queryset = queryset.select_related(*self.object_select_related)
+
+        return queryset
+
+    def get_object(self):
+        if not hasattr(self, '_cached_object'):
+            self._cached_object = super().get_object()
+
+        return self._cached_object
+
+
+class ReadQuerysetMixin:
+    """
+    Loads everything the serializer reads up front, so reading a list costs the same number of queries at any size
+
+    The select_related, prefetch_related and only() calls are planned from the serializer's fields, so nested
+    serializers added later are covered too. They are applied to list and retrieve requests only, so writes never see
+    stale prefetched rows
+    """
+    _query_plans = {}
+
+    def get_query_plan(self) -> QueryPlan:
+        serializer_class = self.get_serializer_class()
+
+        if serializer_class not in self._query_plans:
+            self._query_plans[serializer_class] = plan_serializer(serializer_class())
+
+        return self._query_plans[serializer_class]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        if getattr(self, 'action', None) in ('list', 'retrieve') and isinstance(queryset, QuerySet):
+            queryset = self.get_query_plan().apply(queryset)
+
+        return queryset
+
+
+class CompiledReadMixin:
+    """
+    Renders list and retrieve responses through a CompiledSerializer, which produces the same JSON as the viewset's
+    serializer without its nested-writable machinery
+    """
+    _compiled_serializers = {}
+
+    def get_compiled_serializer(self) -> CompiledSerializer:
+        serializer_class = self.get_serializer_class()
+
+        if serializer_class not in self._compiled_serializers:
+            self._compiled_serializers[serializer_class] = CompiledSerializer(serializer_class())
+
+        return self._compiled_serializers[serializer_class]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        compiled = self.get_compiled_serializer()
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.many(page))
+
+        return Response(compiled.many(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_compiled_serializer().one(self.get_object()))
+
+
+class UserMessageViewSet(CachedObjectMixin, viewsets.ModelViewSet):
     """
     API Endpoint for user messages
     """
@@ -30,8 +147,11 @@ class UserMessageViewSet(viewsets.ModelViewSet):
     queryset = db_models.UserMessage.objects.all()
     serializer_class = serializers.UserMessageSerializer
 
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-id',)
+
 
-class AvatarViewSet(viewsets.ModelViewSet):
+class AvatarViewSet(CachedObjectMixin, viewsets.ModelViewSet):
     """
     API Endpoint for Avatars
     """
@@ -46,7 +166,8 @@ class AvatarViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.AvatarSerializer
 
 
-class AgencyViewSet(viewsets.ModelViewSet):
+class AgencyViewSet(ResponseCacheMixin, CompiledReadMixin, ReadQuerysetMixin, CachedObjectMixin,
+                    viewsets.ModelViewSet):
     """
     API Endpoint for Foundry Agencies
     """
@@ -60,9 +181,10 @@ class AgencyViewSet(viewsets.ModelViewSet):
 
     queryset = db_models.Agency.objects.all()
     serializer_class = serializers.AgencySerializer
+    response_cache_group = 'agencies'
 
 
-class MLSNumberViewSet(viewsets.ModelViewSet):
+class MLSNumberViewSet(ReadQuerysetMixin, viewsets.ModelViewSet):
     """
     API Endpoint for Foundry Agencies
     """
@@ -74,7 +196,7 @@ class MLSNumberViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         if self.kwargs.get('agency_pk') is not None:
-            return MLSNumber.objects.filter(agency=self.kwargs['agency_pk'])
+            return super().get_queryset().filter(agency=self.kwargs['agency_pk'])
 
     def perform_create(self, serializer: serializers.MLSNumberSerializer):
         serializer = serializers.FullMLSNumberSerializer(data={**serializer.data, 'agency': self.kwargs['agency_pk']})
@@ -88,7 +210,8 @@ class MLSNumberViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.MLSNumberSerializer
 
 
-class AllMLSNumbersViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+class AllMLSNumbersViewSet(ReadQuerysetMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                           viewsets.GenericViewSet):
     """
     API Endpoint for searching all the realtors
     """
@@ -103,6 +226,9 @@ class AllMLSNumbersViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, vie
 
     filterset_class = MLSNumberFilterSet
 
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
+
 
 class NearbyAttractionViewSet(viewsets.ModelViewSet):
     """
@@ -132,7 +258,8 @@ class NearbyAttractionViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.NearbyAttractionSerializer
 
 
-class PropertyViewSet(viewsets.ModelViewSet):
+class PropertyViewSet(ConditionalListingMixin, CompiledReadMixin, ReadQuerysetMixin, CachedObjectMixin,
+                      viewsets.ModelViewSet):
     """
     API Endpoint for Properties
     """
@@ -144,6 +271,17 @@ class PropertyViewSet(viewsets.ModelViewSet):
 
     queryset = db_models.Property.objects.all()
     serializer_class = serializers.PropertySerializer
+    object_select_related = ('listing__agent__agency',)
+    listing_lookup_kwarg = 'listing_pk'
+    conditional_actions = ('list', 'retrieve')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        if self.kwargs.get('listing_pk') is not None:
+            queryset = queryset.filter(listing=self.kwargs['listing_pk'])
+
+        return queryset
 
 
 class NearbyAttractionPropertyConnectorViewSet(viewsets.ModelViewSet):
@@ -160,7 +298,8 @@ class NearbyAttractionPropertyConnectorViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.NearbyAttractionPropertyConnectorSerializer
 
 
-class ListingViewSet(viewsets.ModelViewSet):
+class ListingViewSet(ConditionalListingMixin, ResponseCacheMixin, CompiledReadMixin, ReadQuerysetMixin,
+                     CachedObjectMixin, viewsets.ModelViewSet):
     """
     API Endpoint for listings
     """
@@ -174,6 +313,58 @@ class ListingViewSet(viewsets.ModelViewSet):
 
     queryset = db_models.Listing.objects.filter()
     serializer_class = serializers.ListingSerializer
+    object_select_related = ('agent__agency',)
+    response_cache_group = 'listings'
+
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date_posted', '-id')
+    # text searches come back best match first
+    keyset_unpaged_params = ('q',)
+    # the most geohash cells a clusters bbox may be split into, however far in it is zoomed
+    max_cluster_cells = 1024
+
+    @action(detail=False, serializer_class=serializers.ListingClusterSerializer, pagination_class=None)
+    def clusters(self, request):
+        """
+        Group the listings in a map's bbox into clusters sized for its zoom level. Takes the same filters as the list
+        """
+        query = serializers.ListingClustersQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        filterset = self.filterset_class(request.query_params, queryset=self.get_queryset(), request=request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        if filterset.form.cleaned_data.get('bbox') is None:
+            raise ValidationError({'bbox': ['This field is required.']})
+
+        search = filterset.filter_search(db_models.ListingSearch.objects.all())
+
+        # a large bbox at a high zoom would otherwise come back as one cluster per listing
+        min_longitude, min_latitude, max_longitude, max_latitude = filterset.form.cleaned_data['bbox']
+        precision = min(precision_for_zoom(query.validated_data['zoom']),
+                        precision_for_box((min_latitude, min_longitude, max_latitude, max_longitude),
+                                          self.max_cluster_cells))
+
+        return self.get_cached_response(request, lambda: Response(cluster_listings(search, precision)))
+
+    @action(detail=False, url_path='showing_availability', serializer_class=serializers.ListingAvailabilitySerializer,
+            pagination_class=None)
+    def showing_availability(self, request):
+        """
+        Find the free showing slots of several listings between two times
+        """
+        query = serializers.ListingsAvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        listings = db_models.Listing.objects.filter(pk__in=query.validated_data['listings']) \
+            .order_by('pk').values_list('pk', flat=True)
+        availability = get_availability(listings, query.validated_data['from'], query.validated_data['to'],
+                                        query.validated_data['duration'])
+
+        return Response(self.get_serializer([
+            {'listing': listing, 'slots': [{'start': start, 'end': end} for start, end in slots]}
+            for listing, slots in availability.items()
+        ], many=True).data)
 
 
 class ListingsHitViewSet(mixins.CreateModelMixin, GenericViewSet):
@@ -191,6 +382,21 @@ class ListingsHitViewSet(mixins.CreateModelMixin, GenericViewSet):
     queryset = db_models.ListingsHit.objects.all()
     serializer_class = serializers.ListingsHitSerializer
 
+    def perform_create(self, serializer: serializers.ListingsHitSerializer):
+        with transaction.atomic():
+            record_daily_hits([serializer.save()])
+
+    def create(self, request, *args, **kwargs):
+        if not settings.LISTINGS_HIT_BUFFER['ENABLED']:
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        get_hit_buffer().add(serializer.validated_data['listing'].id)
+
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
 
 class ListingImageViewSet(viewsets.ModelViewSet):
     """
@@ -229,7 +435,8 @@ class RoomViewSet(viewsets.ModelViewSet):
         return serializer.errors
 
 
-class HomeAlarmViewSet(mixins.CreateModelMixin,
+class HomeAlarmViewSet(CachedObjectMixin,
+                       mixins.CreateModelMixin,
                        mixins.RetrieveModelMixin,
                        mixins.UpdateModelMixin,
                        viewsets.GenericViewSet):
@@ -251,9 +458,10 @@ class HomeAlarmViewSet(mixins.CreateModelMixin,
 
     queryset = db_models.HomeAlarm.objects.all()
     serializer_class = serializers.HomeAlarmSerializer
+    object_select_related = ('property__listing__agent__agency',)
 
 
-class ShowingViewSet(viewsets.ModelViewSet):
+class ShowingViewSet(ReadQuerysetMixin, CachedObjectMixin, viewsets.ModelViewSet):
     """
     API Endpoint for home alarms
     """
@@ -265,6 +473,35 @@ class ShowingViewSet(viewsets.ModelViewSet):
 
     queryset = db_models.Showing.objects.all()
     serializer_class = serializers.ShowingSerializer
+    object_select_related = ('listing__agent__agency', 'agent__agency')
+
+    @action(detail=False, serializer_class=serializers.ShowingSlotSerializer, pagination_class=None)
+    def availability(self, request, listing_pk=None):
+        """
+        Find the free showing slots of the listing between two times
+        """
+        query = serializers.ShowingAvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        listing = get_object_or_404(db_models.Listing.objects.only('pk'), pk=listing_pk)
+
+        slots = get_availability([listing.pk], query.validated_data['from'], query.validated_data['to'],
+                                 query.validated_data['duration'])[listing.pk]
+
+        return Response(self.get_serializer([{'start': start, 'end': end} for start, end in slots], many=True).data)
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+
+        # a list of showings is booked all or none, checked against the listing's showings in one query
+        serializer = self.get_serializer(data=request.data, many=True, allow_empty=False)
+        serializer.is_valid(raise_exception=True)
+
+        showings = db_models.Showing.book(self.kwargs['listing_pk'],
+                                          [db_models.Showing(**showing) for showing in serializer.validated_data])
+
+        return Response(self.get_serializer(showings, many=True).data, status=status.HTTP_201_CREATED)
 
     def perform_create(self, serializer: serializers.ShowingSerializer):
         serializer = serializers.FullShowingSerializer(data={**serializer.data, 'listing': self.kwargs['listing_pk']})
@@ -291,7 +528,7 @@ class ShowingReviewViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.ShowingReviewSerializer
 
 
-class IAMPolicyViewSet(viewsets.ModelViewSet):
+class IAMPolicyViewSet(ReadQuerysetMixin, IAMPolicyGenerationMixin, viewsets.ModelViewSet):
     """
     API Endpoint for IAM Lists
     """
@@ -305,7 +542,7 @@ class IAMPolicyViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.IAMPolicySerializer
 
 
-class IAMPolicyStatementViewSet(viewsets.ModelViewSet):
+class IAMPolicyStatementViewSet(ReadQuerysetMixin, IAMPolicyGenerationMixin, viewsets.ModelViewSet):
     permission_classes = (make_access_policy('IAMPolicy', 'iam-policy-access-policy'),)
 
     @property
@@ -317,7 +554,7 @@ class IAMPolicyStatementViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         if self.kwargs.get('policy_pk') is not None:
-            return models.IAMPolicyStatement.objects.filter(policy=self.kwargs['policy_pk'])
+            return super().get_queryset().filter(policy=self.kwargs['policy_pk'])
 
     def perform_create(self, serializer: serializers.IAMPolicyStatementSerializer):
         serializer = serializers.FullIAMPolicyStatementSerializer(data={**serializer.data,
@@ -329,7 +566,7 @@ class IAMPolicyStatementViewSet(viewsets.ModelViewSet):
         return serializer.errors
 
 
-class IAMPolicyStatementPrincipalViewSet(viewsets.ModelViewSet):
+class IAMPolicyStatementPrincipalViewSet(ReadQuerysetMixin, IAMPolicyGenerationMixin, viewsets.ModelViewSet):
     permission_classes = (make_access_policy('IAMPolicy', 'iam-policy-access-policy'),)
 
     @property
@@ -341,7 +578,7 @@ class IAMPolicyStatementPrincipalViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         if self.kwargs.get('statement_pk') is not None:
-            return models.IAMPolicyStatementPrincipal.objects.filter(statement=self.kwargs['statement_pk'])
+            return super().get_queryset().filter(statement=self.kwargs['statement_pk'])
 
     def perform_create(self, serializer: serializers.IAMPolicyStatementPrincipalSerializer):
         serializer = serializers.FullIAMPolicyStatementPrincipalSerializer(data={**serializer.data,
@@ -353,7 +590,7 @@ class IAMPolicyStatementPrincipalViewSet(viewsets.ModelViewSet):
         return serializer.errors
 
 
-class IAMPolicyStatementConditionViewSet(viewsets.ModelViewSet):
+class IAMPolicyStatementConditionViewSet(ReadQuerysetMixin, IAMPolicyGenerationMixin, viewsets.ModelViewSet):
     permission_classes = (make_access_policy('IAMPolicy', 'iam-policy-access-policy'),)
 
     @property
@@ -365,7 +602,7 @@ class IAMPolicyStatementConditionViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         if self.kwargs.get('statement_pk') is not None:
-            return models.IAMPolicyStatementCondition.objects.filter(statement=self.kwargs['statement_pk'])
+            return super().get_queryset().filter(statement=self.kwargs['statement_pk'])
 
     def perform_create(self, serializer: serializers.IAMPolicyStatementConditionSerializer):
         serializer = serializers.FullIAMPolicyStatementConditionSerializer(
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0027_room_square_footage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listingshit',
+            name='access_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:42
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_daily_hits(apps, schema_editor):
+    ListingsHit = apps.get_model('database', 'ListingsHit')
+    ListingHitDaily = apps.get_model('database', 'ListingHitDaily')
+
+    totals = ListingsHit.objects.annotate(date=TruncDate('access_time')).values('listing_id', 'date') \
+        .annotate(count=models.Count('id')).order_by()
+
+    ListingHitDaily.objects.bulk_create(
+        (ListingHitDaily(listing_id=total['listing_id'], date=total['date'], count=total['count']) for total in totals),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0028_auto_20261018_0140'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingHitDaily',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_hits', to='database.Listing')),
+            ],
+            options={
+                'unique_together': {('listing', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_hits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0029_listinghitdaily'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
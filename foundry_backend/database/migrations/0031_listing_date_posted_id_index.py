@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0030_listing_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['-date_posted', '-id'], name='listing_date_posted_id'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0031_listing_date_posted_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['postal_code'], name='address_postal_code'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['asking_price', 'open'], name='listing_asking_price_open'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['square_footage'], name='property_square_footage'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:11
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_listing_search(apps, schema_editor):
+    Listing = apps.get_model('database', 'Listing')
+    ListingSearch = apps.get_model('database', 'ListingSearch')
+
+    def count_rooms(room_type):
+        return models.Count('property__rooms', filter=models.Q(property__rooms__type=room_type))
+
+    listings = Listing.objects.order_by().annotate(
+        bedrooms=count_rooms('BEDROOM'),
+        full_bathrooms=count_rooms('BATHROOM'),
+        half_bathrooms=count_rooms('HALF_BATHROOM'),
+    ).values('id', 'asking_price', 'open', 'date_posted', 'property__square_footage', 'property__acreage',
+             'property__type', 'property__address__postal_code', 'property__address__locality',
+             'property__address__state_code', 'bedrooms', 'full_bathrooms', 'half_bathrooms')
+
+    ListingSearch.objects.bulk_create(
+        (ListingSearch(listing_id=listing['id'], asking_price=listing['asking_price'], open=listing['open'],
+                       date_posted=listing['date_posted'], square_footage=listing['property__square_footage'],
+                       acreage=listing['property__acreage'], type=listing['property__type'],
+                       postal_code=listing['property__address__postal_code'],
+                       locality=listing['property__address__locality'],
+                       state_code=listing['property__address__state_code'], bedrooms=listing['bedrooms'],
+                       bathrooms=listing['full_bathrooms'] + Decimal('0.5') * listing['half_bathrooms'])
+         for listing in listings),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0032_listing_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSearch',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search', serialize=False, to='database.Listing')),
+                ('asking_price', models.IntegerField()),
+                ('open', models.BooleanField()),
+                ('date_posted', models.DateTimeField()),
+                ('square_footage', models.IntegerField(null=True)),
+                ('acreage', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('type', models.CharField(max_length=12, null=True)),
+                ('postal_code', models.CharField(max_length=5, null=True)),
+                ('locality', models.CharField(max_length=50, null=True)),
+                ('state_code', models.CharField(max_length=2, null=True)),
+                ('bedrooms', models.PositiveIntegerField(default=0)),
+                ('bathrooms', models.DecimalField(decimal_places=1, default=0, max_digits=4)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listingsearch',
+            index=models.Index(fields=['postal_code', 'asking_price', 'open', 'square_footage'], name='search_postal_code_price'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearch',
+            index=models.Index(fields=['asking_price', 'open', 'square_footage'], name='search_price'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearch',
+            index=models.Index(fields=['square_footage', 'asking_price', 'open'], name='search_square_footage'),
+        ),
+        migrations.RunPython(backfill_listing_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import foundry_backend.database.models
+
+
+def create_listing_text(apps, schema_editor):
+    # other backends search descriptions without an index
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute("CREATE VIRTUAL TABLE listing_text USING fts5(description, tokenize='porter unicode61')")
+    schema_editor.execute('INSERT INTO listing_text (rowid, description) SELECT id, description FROM database_listing')
+
+
+def drop_listing_text(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE listing_text')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0033_listingsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingText',
+            fields=[
+                ('listing', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='text', serialize=False, to='database.Listing')),
+                ('description', foundry_backend.database.models.FullTextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'listing_text',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_listing_text, drop_listing_text),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0034_listingtext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZipCentroid',
+            fields=[
+                ('postal_code', models.CharField(max_length=5, primary_key=True, serialize=False)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='geohash',
+            field=models.CharField(blank=True, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='listingsearch',
+            name='geohash',
+            field=models.CharField(max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='listingsearch',
+            name='latitude',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='listingsearch',
+            name='longitude',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['geohash'], name='address_geohash'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearch',
+            index=models.Index(fields=['geohash', 'latitude', 'longitude'], name='search_geohash'),
+        ),
+    ]
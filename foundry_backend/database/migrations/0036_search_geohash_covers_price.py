@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0035_geocoding'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listingsearch',
+            name='search_geohash',
+        ),
+        migrations.AddIndex(
+            model_name='listingsearch',
+            index=models.Index(fields=['geohash', 'latitude', 'longitude', 'asking_price', 'open'], name='search_geohash'),
+        ),
+    ]
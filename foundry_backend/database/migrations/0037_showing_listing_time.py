@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0036_search_geohash_covers_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='showing',
+            index=models.Index(fields=['listing', 'start_time', 'end_time'], name='showing_listing_time'),
+        ),
+    ]
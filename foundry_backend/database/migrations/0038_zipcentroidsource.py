@@ -0,0 +1,20 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0037_showing_listing_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZipCentroidSource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(blank=True, max_length=64)),
+            ],
+        ),
+    ]
@@ -1,9 +1,11 @@
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MinLengthValidator, MaxLengthValidator, MaxValueValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 import uuid
-from rest_framework.exceptions import ValidationError
+from typing import List
+from rest_framework.exceptions import NotFound, ValidationError
 
 
 class UserMessage(models.Model):
@@ -46,8 +48,18 @@ class Address(models.Model):
     state = models.CharField(max_length=15)
     state_code = models.CharField(max_length=2, validators=[MinLengthValidator(2), MaxLengthValidator(2)])
 
+    # the centre of the zip code, from ZipCentroid. Null when the zip code is unknown
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, null=True, blank=True)
+
     class Meta:
         unique_together = (('street_number', 'street', 'locality', 'postal_code', 'state_code'),)
+        indexes = [
+            # listings are searched by zip code
+            models.Index(fields=['postal_code'], name='address_postal_code'),
+            models.Index(fields=['geohash'], name='address_geohash'),
+        ]
 
     def to_dict(self):
         return {
@@ -60,6 +72,25 @@ class Address(models.Model):
         }
 
 
+class ZipCentroid(models.Model):
+    """
+    Where a zip code is, for geocoding addresses without an online service
+    """
+    postal_code = models.CharField(max_length=5, primary_key=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+
+class ZipCentroidSource(models.Model):
+    """
+    The gazetteer file the zip code centroids were last loaded from, so that loading the same file again can be skipped
+    """
+    SOURCE_ID = 1
+
+    # the hash of the gazetteer file last loaded
+    source_hash = models.CharField(max_length=64, blank=True)
+
+
 class Agency(models.Model):
     """
     Represents a real estate agency
@@ -110,13 +141,107 @@ class Listing(models.Model):
     date_posted = models.DateTimeField(auto_now_add=True)
     open = models.BooleanField(default=True)
 
+    # bumped whenever the listing or anything nested in it changes, for conditional GETs
+    last_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination walks listings newest first
+            models.Index(fields=['-date_posted', '-id'], name='listing_date_posted_id'),
+            # price ranges, with open checked from the index. Leading with open would make SQLite estimate it as
+            # more selective than a zip code, and pick it over the zip code for searches that filter by both
+            models.Index(fields=['asking_price', 'open'], name='listing_asking_price_open'),
+        ]
+
 
 class ListingsHit(models.Model):
     """
     Stores a hit for a model
     """
     listing = models.ForeignKey(Listing, related_name='hits', on_delete=models.CASCADE)
-    access_time = models.DateTimeField(auto_now_add=True)
+    # not auto_now_add, so that buffered hits keep the time they were made rather than when they were written
+    access_time = models.DateTimeField(default=timezone.now)
+
+
+class ListingHitDaily(models.Model):
+    """
+    The number of hits a listing received on a (local) day
+    """
+    listing = models.ForeignKey(Listing, related_name='daily_hits', on_delete=models.CASCADE)
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('listing', 'date'),)
+
+
+class ListingSearch(models.Model):
+    """
+    A listing, its property and its address flattened into one row, so that searches read a single table. Kept in
+    sync by foundry_backend.api.listing_search
+    """
+    listing = models.OneToOneField(Listing, primary_key=True, related_name='search', on_delete=models.CASCADE)
+    asking_price = models.IntegerField()
+    open = models.BooleanField()
+    date_posted = models.DateTimeField()
+
+    # null until the listing has a property
+    square_footage = models.IntegerField(null=True)
+    acreage = models.DecimalField(null=True, decimal_places=2, max_digits=5)
+    type = models.CharField(null=True, max_length=12)
+    postal_code = models.CharField(null=True, max_length=5)
+    locality = models.CharField(null=True, max_length=50)
+    state_code = models.CharField(null=True, max_length=2)
+
+    bedrooms = models.PositiveIntegerField(default=0)
+    # half bathrooms count as 0.5
+    bathrooms = models.DecimalField(default=0, decimal_places=1, max_digits=4)
+
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    geohash = models.CharField(null=True, max_length=12)
+
+    class Meta:
+        # covering indexes for the shapes ListingFilterSet searches by
+        indexes = [
+            models.Index(fields=['geohash', 'latitude', 'longitude', 'asking_price', 'open'], name='search_geohash'),
+            models.Index(fields=['postal_code', 'asking_price', 'open', 'square_footage'],
+                         name='search_postal_code_price'),
+            models.Index(fields=['asking_price', 'open', 'square_footage'], name='search_price'),
+            models.Index(fields=['square_footage', 'asking_price', 'open'], name='search_square_footage'),
+        ]
+
+
+class FullTextField(models.TextField):
+    """
+    A column of a SQLite FTS5 table, which can be searched with `__match`
+    """
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return '{} MATCH {}'.format(lhs, rhs), lhs_params + rhs_params
+
+
+class ListingText(models.Model):
+    """
+    The FTS5 index over listing descriptions, on SQLite. Kept in sync by foundry_backend.api.text_search, which
+    writes to it with raw SQL
+    """
+    listing = models.OneToOneField(Listing, primary_key=True, db_column='rowid', related_name='text',
+                                   on_delete=models.DO_NOTHING, db_constraint=False)
+    description = FullTextField()
+    # FTS5's hidden bm25 column, lowest for the best matches
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'listing_text'
 
 
 def listing_path_generator(_, filename, generator=uuid.uuid4):
@@ -151,6 +276,9 @@ class Property(models.Model):
                                   decimal_places=2, max_digits=5)
     type = models.CharField(max_length=12, choices=PROPERTY_TYPES)
 
+    class Meta:
+        indexes = [models.Index(fields=['square_footage'], name='property_square_footage')]
+
 
 class NearbyAttraction(models.Model):
     """
@@ -231,9 +359,11 @@ class Showing(models.Model):
     agent = models.ForeignKey(MLSNumber, on_delete=models.CASCADE)
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
 
-    def save(self, force_insert=False, force_update=False, using=None,
-             update_fields=None):
+    class Meta:
+        # conflicts are found by range scans over a listing's showings
+        indexes = [models.Index(fields=['listing', 'start_time', 'end_time'], name='showing_listing_time')]
 
+    def check_times(self):
         if self.start_time > self.end_time:
             raise ValidationError({'start_time': "\'start_time\' cannot be less than \'end_time\'.",
                                    'end_time': "\'start_time\' cannot be greater than \'end_time\'."})
@@ -241,20 +371,102 @@ class Showing(models.Model):
         if self.start_time == self.end_time:
             raise ValidationError("\'start_time\' cannot equal \'end_time\'.")
 
-        query = Showing.objects.exclude(id=self.id).filter(listing=self.listing).filter(
-                # Preceding overlap
-                models.Q(start_time__gte=self.start_time, start_time__lt=self.end_time, end_time__gte=self.end_time) |
-                # Following overlap
-                models.Q(end_time__gt=self.start_time, start_time__lte=self.start_time)
-        )
+    def overlaps(self, other: 'Showing') -> bool:
+        return self.start_time < other.end_time and other.start_time < self.end_time
 
-        if query.exists():
-            conflicting_listing = query.get()
-            raise ValidationError("The time range conflicts with a showing from {} to {}".format(
-                conflicting_listing.start_time, conflicting_listing.end_time)
-            )
+    @staticmethod
+    def lock_listing(listing_id: int) -> bool:
+        """
+        Lock a listing's row until the end of the transaction, so that bookings for it are checked one at a time
 
-        super().save(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
+        :param listing_id: the listing to lock
+        :return: whether the listing exists
+        """
+        if connection.features.has_select_for_update:
+            return Listing.objects.select_for_update().filter(pk=listing_id).exists()
+
+        # SQLite has no row locks, but a write takes the database's write lock, which other writers wait for
+        return Listing.objects.filter(pk=listing_id).update(id=models.F('id')) == 1
+
+    @classmethod
+    def find_conflicts(cls, listing_id: int, showings: List['Showing']) -> models.QuerySet:
+        """
+        Find a listing's showings that overlap any of some showings, in one query
+
+        :param listing_id: the listing the showings are of
+        :param showings: the showings to check
+        :return: the saved showings they overlap
+        """
+        overlapping = models.Q()
+        for showing in showings:
+            overlapping |= models.Q(start_time__lt=showing.end_time, end_time__gt=showing.start_time)
+
+        return cls.objects.filter(overlapping, listing_id=listing_id).order_by('start_time')
+
+    @classmethod
+    def book(cls, listing_id: int, showings: List['Showing']) -> List['Showing']:
+        """
+        Book several showings of a listing, all or none
+
+        :param listing_id: the listing the showings are of
+        :param showings: the unsaved showings
+        :return: the saved showings
+        """
+        errors = [{} for _ in showings]
+
+        for index, showing in enumerate(showings):
+            showing.listing_id = listing_id
+            try:
+                showing.check_times()
+            except ValidationError as e:
+                errors[index] = e.detail
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        by_start = sorted(range(len(showings)), key=lambda index: showings[index].start_time)
+        for before, after in zip(by_start, by_start[1:]):
+            if showings[after].overlaps(showings[before]):
+                errors[after] = ['The time range conflicts with showing {} of this request'.format(before)]
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        with transaction.atomic():
+            if not cls.lock_listing(listing_id):
+                raise NotFound()
+
+            for conflict in cls.find_conflicts(listing_id, showings):
+                for index, showing in enumerate(showings):
+                    if showing.overlaps(conflict) and not errors[index]:
+                        errors[index] = ['The time range conflicts with a showing from {} to {}'.format(
+                            conflict.start_time, conflict.end_time)]
+
+            if any(errors):
+                raise ValidationError(errors)
+
+            for showing in showings:
+                super(Showing, showing).save()
+
+        return showings
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+
+        self.check_times()
+
+        with transaction.atomic():
+            self.lock_listing(self.listing_id)
+
+            conflict = self.find_conflicts(self.listing_id, [self]).exclude(id=self.id).first()
+
+            if conflict is not None:
+                raise ValidationError("The time range conflicts with a showing from {} to {}".format(
+                    conflict.start_time, conflict.end_time)
+                )
+
+            super().save(force_insert=force_insert, force_update=force_update, using=using,
+                         update_fields=update_fields)
 
 
 class ShowingReview(models.Model):
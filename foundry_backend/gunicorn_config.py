@@ -0,0 +1,13 @@
+"""
+Gunicorn settings for foundry_backend, used with ``gunicorn -c python:foundry_backend.gunicorn_config``
+
+For more information on this file, see
+https://docs.gunicorn.org/en/stable/settings.html
+"""
+
+
+def post_worker_init(worker):
+    # bootstrap and start the nightly tasks once the worker has loaded the app. Importing wsgi.py has no side effects,
+    # so that tests and management commands can import it without a database
+    from foundry_backend.api.startup import start_worker
+    start_worker()